@@ -0,0 +1,62 @@
+import grpc
+import sys
+import twopc_pb2
+import twopc_pb2_grpc
+
+
+def list_transactions(stub, args):
+    request = twopc_pb2.ListTransactionsRequest(states=args.state, after_id=args.after, limit=args.limit)
+    last = None
+    for info in stub.ListTransactions(request):
+        details = ''
+        if info.acked:
+            details = f' acked={",".join(map(str, info.acked))}'
+        if info.peers:
+            details += f' peers={",".join(info.peers)}'
+        print(f'{info.transaction_id} {twopc_pb2.State.Name(info.state)}{details}')
+        last = info.transaction_id
+    if args.limit and last is not None:
+        print(f'Next page: --after {last}', file=sys.stderr)
+
+
+def force_resolve(stub, args):
+    request = twopc_pb2.ForceResolveRequest(transaction_id=args.transaction_id,
+                                            outcome=twopc_pb2.State.Value(args.outcome or 'UNKNOWN'))
+    response = stub.ForceResolve(request)
+    print(f'{args.transaction_id} {twopc_pb2.State.Name(response.state)}')
+
+
+def show_metrics(stub, args):
+    for name, value in sorted(stub.GetMetrics(twopc_pb2.Empty()).values.items()):
+        print(f'{name:<40} {value:g}')
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Inspect and repair transactions on a running coordinator or participant')
+    parser.add_argument('address', help='Node address (e.g., localhost:50053)')
+    commands = parser.add_subparsers(dest='command', required=True)
+    listing = commands.add_parser('list', help='List transactions in id order')
+    listing.add_argument('--state', action='append', default=[], help='Only transactions in this state (repeatable)')
+    listing.add_argument('--after', type=int, default=0, help='Start after this transaction id')
+    listing.add_argument('--limit', type=int, default=0, help='Page size (default: no limit)')
+    listing.set_defaults(action=list_transactions)
+    resolve = commands.add_parser('resolve', help='Force an in-doubt or stuck transaction to finish')
+    resolve.add_argument('transaction_id', type=int)
+    resolve.add_argument('--outcome', choices=['COMMITTED', 'ABORTED'],
+                         help='Outcome to force (default: whatever the node can decide from its log and peers)')
+    resolve.set_defaults(action=force_resolve)
+    metrics = commands.add_parser('metrics', help='Show the node\'s metrics')
+    metrics.set_defaults(action=show_metrics)
+    args = parser.parse_args()
+    if args.command == 'list':
+        unknown = [state for state in args.state if state not in twopc_pb2.State.keys()]
+        if unknown:
+            parser.error(f'unknown state(s): {", ".join(unknown)}')
+
+    stub = twopc_pb2_grpc.TwoPCStub(grpc.insecure_channel(args.address))
+    try:
+        args.action(stub, args)
+    except grpc.RpcError as e:
+        print(f'{e.code().name}: {e.details()}', file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,233 @@
+import collections
+import threading
+import time
+
+MAX_IN_FLIGHT = 10  # Transactions executing at once when participants are healthy
+MAX_QUEUE = 20  # Transactions allowed to wait for a slot before new ones are rejected
+QUEUE_TIMEOUT = 1.0  # seconds a transaction may wait for a slot
+TARGET_LATENCY = 0.05  # seconds; participant RPC latency above this shrinks the in-flight limit
+EWMA_WEIGHT = 0.2  # Weight of the newest sample in the latency averages
+DEFAULT_TENANT = 'default'  # Tenant of requests that name no tenant, or one without a configured weight
+DEFAULT_WEIGHT = 1.0
+RATE_WINDOW = 10  # seconds of completions behind each tenant's throughput figure
+
+
+def average(current, sample):
+    return sample if current is None else (1 - EWMA_WEIGHT) * current + EWMA_WEIGHT * sample
+
+
+class Ticket:
+    __slots__ = ('tenant', 'queued_at', 'admitted_at', 'event')
+
+    def __init__(self, tenant):
+        self.tenant = tenant
+        self.queued_at = time.monotonic()
+        self.admitted_at = None
+        self.event = None
+
+
+class Tenant:
+    def __init__(self, name, weight):
+        self.name = name
+        self.weight = weight
+        self.waiting = collections.deque()
+        self.virtual_time = 0.0
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.queue_wait = None
+        self.service_time = None
+        self.completions = collections.deque()  # [second, count] for the last RATE_WINDOW seconds
+
+    def complete(self, now):
+        second = int(now)
+        if self.completions and self.completions[-1][0] == second:
+            self.completions[-1][1] += 1
+        else:
+            self.completions.append([second, 1])
+        while self.completions[0][0] <= second - RATE_WINDOW:
+            self.completions.popleft()
+
+    def throughput(self, now):
+        return sum(count for second, count in self.completions if second > now - RATE_WINDOW) / RATE_WINDOW
+
+    def idle(self, now):
+        # Nothing queued or running, and nothing left to report in the throughput window
+        return not self.waiting and not self.in_flight and not (self.completions and self.completions[-1][0] > now - RATE_WINDOW)
+
+
+class AdmissionController:
+    """Bounds the transactions a coordinator works on and rejects the excess early.
+
+    At most `limit` transactions run at once and at most max_queue wait for a slot.
+    The limit starts at max_in_flight and shrinks in proportion to how far the
+    measured participant latency is above target_latency, so an overloaded cluster
+    takes on less work instead of letting every transaction slow down.
+
+    Waiting transactions are queued per tenant, and freed slots go to tenants by
+    weighted fair queuing: each admission advances the tenant's virtual time by
+    1/weight and the backlogged tenant with the lowest virtual time goes next, so a
+    tenant flooding the coordinator only delays itself. When the queue is full, a
+    newcomer from a tenant below its fair share of the queue pushes out the newest
+    waiter of the tenant furthest above its share. A transaction is rejected straight
+    away when the expected wait at its tenant's share of the slots, estimated from the
+    measured service time, is longer than queue_timeout.
+
+    Only tenants given a weight get their own queue; every other tenant id shares the
+    default tenant's, so clients cannot claim extra shares by inventing ids. Tenants
+    are forgotten once idle for RATE_WINDOW seconds.
+    """
+
+    def __init__(self, max_in_flight=MAX_IN_FLIGHT, max_queue=MAX_QUEUE, queue_timeout=QUEUE_TIMEOUT,
+                 target_latency=TARGET_LATENCY, weights=None):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.target_latency = target_latency
+        self.weights = weights or {}
+        self.limit = max_in_flight
+        self.lock = threading.Lock()
+        self.tenants = {}
+        self.virtual_clock = 0.0
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.participant_latency = None
+        self.service_time = None
+
+    def tenant(self, name):
+        if name not in self.weights:
+            name = DEFAULT_TENANT
+        if name not in self.tenants:
+            self.tenants[name] = Tenant(name, self.weights.get(name, DEFAULT_WEIGHT))
+        return self.tenants[name]
+
+    def backlogged(self):
+        return [tenant for tenant in self.tenants.values() if tenant.waiting]
+
+    def expected_wait(self, tenant):
+        if self.service_time is None:
+            return 0.0
+        weights = sum(other.weight for other in self.backlogged() if other is not tenant) + tenant.weight
+        share = self.limit * tenant.weight / weights
+        return (len(tenant.waiting) + 1) / share * self.service_time
+
+    def make_room(self, tenant):
+        # Queue full: push out the newest waiter of the tenant most above its share, if that is not us
+        backlogged = self.backlogged()
+        if not backlogged:
+            return False
+        heaviest = max(backlogged, key=lambda other: len(other.waiting) / other.weight)
+        if heaviest is tenant or len(heaviest.waiting) / heaviest.weight <= (len(tenant.waiting) + 1) / tenant.weight:
+            return False
+        ticket = heaviest.waiting.pop()
+        self.queued -= 1
+        ticket.event.set()
+        return True
+
+    def acquire(self, tenant_name=None):
+        with self.lock:
+            tenant = self.tenant(tenant_name)
+            ticket = Ticket(tenant)
+            if self.queued == 0 and self.in_flight < self.limit:
+                self.admit(ticket)
+                return ticket
+            if self.expected_wait(tenant) > self.queue_timeout or \
+                    (self.queued >= self.max_queue and not self.make_room(tenant)):
+                self.reject(tenant)
+                return None
+            if not tenant.waiting:
+                # A tenant that was idle starts at the current virtual time instead of using up saved credit
+                tenant.virtual_time = max(tenant.virtual_time, self.virtual_clock)
+            ticket.event = threading.Event()
+            tenant.waiting.append(ticket)
+            self.queued += 1
+        ticket.event.wait(self.queue_timeout)
+        with self.lock:
+            if ticket.admitted_at is not None:
+                return ticket
+            if ticket in tenant.waiting:
+                tenant.waiting.remove(ticket)
+                self.queued -= 1
+            self.reject(tenant)
+            return None
+
+    def admit(self, ticket):
+        tenant = ticket.tenant
+        ticket.admitted_at = time.monotonic()
+        tenant.queue_wait = average(tenant.queue_wait, ticket.admitted_at - ticket.queued_at)
+        tenant.virtual_time += 1 / tenant.weight
+        tenant.in_flight += 1
+        tenant.admitted += 1
+        self.in_flight += 1
+        self.admitted += 1
+
+    def reject(self, tenant):
+        tenant.rejected += 1
+        self.rejected += 1
+
+    def dispatch(self):
+        # Hands free slots to waiting tenants in weighted-fair order; called with self.lock held
+        while self.in_flight < self.limit and self.queued:
+            tenant = min(self.backlogged(), key=lambda tenant: tenant.virtual_time)
+            self.virtual_clock = tenant.virtual_time
+            ticket = tenant.waiting.popleft()
+            self.queued -= 1
+            self.admit(ticket)
+            ticket.event.set()
+
+    def release(self, ticket):
+        now = time.monotonic()
+        elapsed = now - ticket.admitted_at
+        with self.lock:
+            tenant = ticket.tenant
+            tenant.in_flight -= 1
+            tenant.completed += 1
+            tenant.service_time = average(tenant.service_time, elapsed)
+            tenant.complete(now)
+            self.in_flight -= 1
+            self.completed += 1
+            self.service_time = average(self.service_time, elapsed)
+            self.dispatch()
+            for name in [name for name, other in self.tenants.items() if other.idle(now)]:
+                del self.tenants[name]
+
+    def record_latency(self, seconds):
+        with self.lock:
+            self.participant_latency = average(self.participant_latency, seconds)
+            if self.participant_latency <= self.target_latency:
+                self.limit = self.max_in_flight
+            else:
+                self.limit = max(1, int(self.max_in_flight * self.target_latency / self.participant_latency))
+            self.dispatch()
+
+    def metrics(self):
+        now = time.monotonic()
+        with self.lock:
+            values = {
+                'admission.limit': self.limit,
+                'admission.in_flight': self.in_flight,
+                'admission.queue_depth': self.queued,
+                'admission.admitted': self.admitted,
+                'admission.rejected': self.rejected,
+                'admission.completed': self.completed,
+                'admission.participant_latency': self.participant_latency or 0.0,
+                'admission.service_time': self.service_time or 0.0,
+            }
+            for tenant in self.tenants.values():
+                prefix = f'tenant.{tenant.name}'
+                values.update({
+                    f'{prefix}.weight': tenant.weight,
+                    f'{prefix}.in_flight': tenant.in_flight,
+                    f'{prefix}.queue_depth': len(tenant.waiting),
+                    f'{prefix}.admitted': tenant.admitted,
+                    f'{prefix}.rejected': tenant.rejected,
+                    f'{prefix}.completed': tenant.completed,
+                    f'{prefix}.queue_wait': tenant.queue_wait or 0.0,
+                    f'{prefix}.latency': tenant.service_time or 0.0,
+                    f'{prefix}.throughput': tenant.throughput(now),
+                })
+            return values
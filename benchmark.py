@@ -0,0 +1,105 @@
+import logging
+import statistics
+import time
+import sys
+from concurrent import futures
+import coordinator
+import participant
+import faults
+import profiling
+from cluster import LocalCluster, wait_until
+
+
+def measure_latency(cluster, transactions):
+    latencies = []
+    for _ in range(transactions):
+        transaction_id = cluster.coordinator.new_transaction_id()
+        started = time.perf_counter()
+        cluster.coordinator.initialize_transaction(transaction_id)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def measure_throughput(cluster, transactions, concurrency):
+    def run_one(_):
+        cluster.coordinator.initialize_transaction(cluster.coordinator.new_transaction_id())
+
+    started = time.perf_counter()
+    with futures.ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(run_one, range(transactions)))
+    return transactions / (time.perf_counter() - started)
+
+
+def measure_blocking(cluster, injector, three_phase, outage):
+    # Crash the coordinator right after its last decision before Commit and keep it down for
+    # `outage` seconds: 2PC participants stay PREPARED until it is back, 3PC participants finish alone.
+    injector.install()
+    injector.arm('coordinator:PRECOMMITTING' if three_phase else 'coordinator:COMMITTING')
+    transaction_id = cluster.coordinator.new_transaction_id()
+    try:
+        cluster.coordinator.initialize_transaction(transaction_id)
+    except faults.InjectedCrash:
+        pass
+    crashed_at = time.perf_counter()
+    cluster.crash_coordinator()
+    if not cluster.wait_resolved(transaction_id, outage):
+        cluster.start_coordinator()
+        cluster.wait_resolved(transaction_id, outage)
+    blocked = time.perf_counter() - crashed_at
+    states = set(cluster.participant_states(transaction_id))
+    injector.uninstall()
+    return blocked, states
+
+
+def compare(args):
+    results = []
+    for three_phase in (False, True):
+        injector = faults.FaultInjector()
+        cluster = LocalCluster(args.participants, injector, three_phase=three_phase).start()
+        try:
+            latencies = measure_latency(cluster, args.transactions)
+            throughput = measure_throughput(cluster, args.transactions, args.concurrency)
+            wait_until(lambda: not cluster.coordinator.commit_progress, coordinator.TIMEOUT)
+            blocked, states = measure_blocking(cluster, injector, three_phase, args.outage)
+        finally:
+            cluster.stop()
+        latencies.sort()
+        results.append({
+            'mode': '3PC' if three_phase else '2PC',
+            'mean': statistics.mean(latencies),
+            'p99': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+            'throughput': throughput,
+            'blocked': blocked,
+            'outcome': '/'.join(sorted(str(state) for state in states)),
+        })
+    return results
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Compare 2PC and 3PC on an in-process cluster')
+    parser.add_argument('--participants', type=int, default=2, help='Number of participants')
+    parser.add_argument('--transactions', type=int, default=200, help='Transactions per latency and throughput run')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent clients for the throughput run')
+    parser.add_argument('--timeout', type=float, default=1.0, help='Coordinator and participant timeout in seconds')
+    parser.add_argument('--outage', type=float, default=5.0, help='Seconds the coordinator stays down in the blocking run')
+    parser.add_argument('--profile', metavar='OUTPUT', help='Profile the whole run; writes OUTPUT.collapsed and OUTPUT.txt')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.CRITICAL)
+    coordinator.TIMEOUT = participant.TIMEOUT = args.timeout
+
+    if args.profile:
+        profiling.start()
+    results = compare(args)
+    if args.profile:
+        print(f'Profile written to {", ".join(profiling.stop(args.profile))}')
+    print(f'{"mode":<5} {"mean ms":>8} {"p99 ms":>8} {"tx/s":>8} {"blocked ms":>11}  outcome after coordinator crash')
+    for result in results:
+        print(f'{result["mode"]:<5} {result["mean"] * 1000:>8.2f} {result["p99"] * 1000:>8.2f} '
+              f'{result["throughput"]:>8.1f} {result["blocked"] * 1000:>11.1f}  {result["outcome"]}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
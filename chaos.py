@@ -0,0 +1,352 @@
+import grpc
+import logging
+import threading
+import time
+import sys
+import coordinator
+import participant
+import faults
+import twopc_pb2
+import twopc_pb2_grpc
+from cluster import LocalCluster, FINAL_STATES, wait_until
+
+SCENARIOS = {}
+
+
+def scenario(func):
+    SCENARIOS[func.__name__] = func
+    return func
+
+
+def three_phase(func):
+    func.three_phase = True
+    return func
+
+
+class Run:
+    def __init__(self, cluster, injector):
+        self.cluster = cluster
+        self.injector = injector
+        self.failed_at = None
+        self.restarted_at = None
+
+    @property
+    def coordinator(self):
+        return self.cluster.coordinator
+
+    def begin(self):
+        return self.coordinator.new_transaction_id()
+
+    def failed(self):
+        if self.failed_at is None:
+            self.failed_at = time.monotonic()
+
+    def expect_crash(self, action):
+        try:
+            action()
+        except faults.InjectedCrash:
+            self.failed()
+            return
+        raise AssertionError('Armed crash point was never reached')
+
+    def wait_for_crash(self, timeout):
+        if not self.injector.crashed.wait(timeout):
+            raise AssertionError('Armed crash point was never reached')
+        self.failed()
+
+    def ignore_crash(self, action, *args):
+        # For work left running on a node that is crashed underneath it
+        try:
+            action(*args)
+        except faults.InjectedCrash:
+            pass
+
+    def restart_coordinator(self):
+        self.restarted_at = time.monotonic()
+        self.cluster.start_coordinator()
+
+    def restart_participant(self, i):
+        self.restarted_at = time.monotonic()
+        self.cluster.start_participant(i)
+
+
+@scenario
+def coordinator_crash_before_prepare(run):
+    # STARTED is logged but no Prepare went out: recovery must abort
+    run.injector.arm('coordinator:STARTED')
+    transaction_id = run.begin()
+    run.expect_crash(lambda: run.coordinator.initialize_transaction(transaction_id))
+    run.cluster.crash_coordinator()
+    run.restart_coordinator()
+    return transaction_id, 'ABORTED'
+
+
+@scenario
+def coordinator_crash_after_decision(run):
+    # Every participant is PREPARED and blocked until the restarted coordinator re-drives the commit
+    run.injector.arm('coordinator:COMMITTING')
+    transaction_id = run.begin()
+    run.expect_crash(lambda: run.coordinator.initialize_transaction(transaction_id))
+    run.cluster.crash_coordinator()
+    run.restart_coordinator()
+    return transaction_id, 'COMMITTED'
+
+
+@scenario
+def coordinator_crash_after_decision_fsync_loss(run):
+    # The decision record is forced, so losing the unsynced WAL tail must not lose it
+    run.injector.arm('coordinator:COMMITTING')
+    transaction_id = run.begin()
+    run.expect_crash(lambda: run.coordinator.initialize_transaction(transaction_id))
+    run.cluster.crash_coordinator(lose_unsynced=True)
+    run.restart_coordinator()
+    return transaction_id, 'COMMITTED'
+
+
+@scenario
+def coordinator_crash_losing_ack_records(run):
+    # Ack records are not forced; after losing them recovery resends Commit
+    run.injector.arm('coordinator:COMMITTED')
+    transaction_id = run.begin()
+    run.coordinator.initialize_transaction(transaction_id)
+    run.wait_for_crash(coordinator.TIMEOUT)
+    run.cluster.crash_coordinator(lose_unsynced=True)
+    run.restart_coordinator()
+    return transaction_id, 'COMMITTED'
+
+
+@scenario
+def participant_crash_after_prepare(run):
+    # The coordinator sees the failed Prepare and aborts; the participant learns this on recovery
+    run.injector.arm('Participant 1:PREPARED')
+    transaction_id = run.begin()
+    run.coordinator.initialize_transaction(transaction_id)
+    run.wait_for_crash(coordinator.TIMEOUT)
+    run.cluster.crash_participant(0)
+    run.restart_participant(0)
+    return transaction_id, 'ABORTED'
+
+
+@scenario
+def dropped_commit(run):
+    # Participant 2 never hears the decision and stays PREPARED until the coordinator restarts
+    run.injector.drop('Commit', 'Participant 2')
+    transaction_id = run.begin()
+    run.coordinator.initialize_transaction(transaction_id)
+    run.failed()
+    wait_until(lambda: run.coordinator.get_transaction_state(transaction_id)[1] == [0], coordinator.TIMEOUT)
+    run.cluster.crash_coordinator()
+    run.restart_coordinator()
+    return transaction_id, 'COMMITTED'
+
+
+@scenario
+def lost_prepare_response(run):
+    # Participant 2 prepares but its YES vote never arrives
+    run.injector.drop('Prepare', 'Participant 2', phase='response')
+    transaction_id = run.begin()
+    run.failed()
+    run.coordinator.initialize_transaction(transaction_id)
+    return transaction_id, 'ABORTED'
+
+
+@scenario
+def delayed_prepare(run):
+    # Participant 1's Prepare is held past the coordinator timeout and only delivered after the abort
+    rule = run.injector.hold('Prepare', 'Participant 1')
+    transaction_id = run.begin()
+    run.failed()
+    run.coordinator.initialize_transaction(transaction_id)
+    rule.gate.set()
+    return transaction_id, 'ABORTED'
+
+
+@scenario
+def coordinator_down_peer_not_voted(run):
+    # Participant 1 is PREPARED, the coordinator dies before Participant 2 votes: peers settle on abort
+    rule = run.injector.hold('Prepare', 'Participant 2')
+    transaction_id = run.begin()
+    threading.Thread(target=run.ignore_crash, args=(run.coordinator.initialize_transaction, transaction_id),
+                     daemon=True).start()
+    wait_until(lambda: run.cluster.participant_states(transaction_id)[0] == 'PREPARED', coordinator.TIMEOUT)
+    run.failed()
+    run.cluster.crash_coordinator()
+    run.cluster.wait_resolved(transaction_id, participant.TIMEOUT + participant.PEER_QUERY_TIMEOUT * 2)
+    rule.gate.set()
+    run.restart_coordinator()
+    return transaction_id, 'ABORTED'
+
+
+@scenario
+def coordinator_down_peer_committed(run):
+    # Participant 2 missed the Commit and the coordinator is gone; Participant 1 tells it the outcome
+    run.injector.drop('Commit', 'Participant 2')
+    transaction_id = run.begin()
+    run.coordinator.initialize_transaction(transaction_id)
+    wait_until(lambda: run.cluster.participant_states(transaction_id)[0] == 'COMMITTED', coordinator.TIMEOUT)
+    run.failed()
+    run.cluster.crash_coordinator()
+    run.cluster.wait_resolved(transaction_id, participant.TIMEOUT + participant.PEER_QUERY_TIMEOUT * 2)
+    run.restart_coordinator()
+    return transaction_id, 'COMMITTED'
+
+
+@scenario
+def forced_abort_during_prepare(run):
+    # An operator aborts while a vote is held: ForceResolve refuses the live transaction, and an abort
+    # decided anyway (as by a ForceResolve that got in first) is not overwritten by the late commit
+    rule = run.injector.hold('Prepare', 'Participant 2', phase='response')
+    transaction_id = run.begin()
+    outcome = []
+    thread = threading.Thread(target=lambda: outcome.append(run.coordinator.initialize_transaction(transaction_id)))
+    thread.start()
+    wait_until(lambda: run.cluster.participant_states(transaction_id)[1] == 'PREPARED', coordinator.TIMEOUT)
+    run.failed()
+    stub = twopc_pb2_grpc.TwoPCStub(grpc.insecure_channel(run.cluster.coordinator_address))
+    try:
+        stub.ForceResolve(twopc_pb2.ForceResolveRequest(transaction_id=transaction_id, outcome=twopc_pb2.ABORTED))
+        raise AssertionError('ForceResolve aborted a transaction that was still collecting votes')
+    except grpc.RpcError as e:
+        if e.code() != grpc.StatusCode.FAILED_PRECONDITION:
+            raise
+    run.coordinator.abort_transaction(transaction_id)
+    rule.gate.set()
+    thread.join(coordinator.TIMEOUT * 2)
+    if outcome != [False]:
+        raise AssertionError(f'Client was told {outcome} after the abort')
+    return transaction_id, 'ABORTED'
+
+
+@scenario
+def truncated_transaction_presumes_abort(run):
+    # Truncation drops a finished transaction, whose id then presumes abort, but keeps one still awaiting acks
+    finished = run.begin()
+    run.coordinator.initialize_transaction(finished)
+    wait_until(lambda: run.coordinator.get_transaction_state(finished)[0] == 'COMMITTED', coordinator.TIMEOUT)
+    run.injector.drop('Commit', 'Participant 2')
+    transaction_id = run.begin()
+    run.coordinator.initialize_transaction(transaction_id)
+    run.failed()
+    wait_until(lambda: run.coordinator.get_transaction_state(transaction_id)[1] == [0], coordinator.TIMEOUT)
+    if run.coordinator.truncate_finished(run.begin()) != 1:
+        raise AssertionError('Truncation did not remove exactly the finished transaction')
+    response = run.coordinator.FetchCommit(twopc_pb2.FetchCommitRequest(transaction_id=finished), None)
+    if response.commit or response.state != twopc_pb2.ABORTED:
+        raise AssertionError('A truncated transaction did not presume abort')
+    if run.coordinator.get_transaction_state(transaction_id)[0] != 'COMMITTING':
+        raise AssertionError('Truncation removed a transaction still awaiting acks')
+    run.cluster.crash_coordinator()
+    run.restart_coordinator()
+    return transaction_id, 'COMMITTED'
+
+
+@scenario
+@three_phase
+def three_phase_coordinator_crash_before_precommit(run):
+    # Nobody pre-committed, so the PREPARED participants abort on their own instead of blocking
+    run.injector.arm('coordinator:PRECOMMITTING')
+    transaction_id = run.begin()
+    run.expect_crash(lambda: run.coordinator.initialize_transaction(transaction_id))
+    run.cluster.crash_coordinator()
+    run.cluster.wait_resolved(transaction_id, participant.TIMEOUT + participant.PEER_QUERY_TIMEOUT * 2)
+    run.restart_coordinator()
+    return transaction_id, 'ABORTED'
+
+
+@scenario
+@three_phase
+def three_phase_coordinator_crash_after_precommit(run):
+    # Everybody pre-committed, so the participants commit on their own instead of blocking
+    run.injector.arm('coordinator:COMMITTING')
+    transaction_id = run.begin()
+    run.expect_crash(lambda: run.coordinator.initialize_transaction(transaction_id))
+    run.cluster.crash_coordinator()
+    run.cluster.wait_resolved(transaction_id, participant.TIMEOUT + participant.PEER_QUERY_TIMEOUT * 2)
+    run.restart_coordinator()
+    return transaction_id, 'COMMITTED'
+
+
+@scenario
+@three_phase
+def three_phase_silent_peer_blocks_abort(run):
+    # Participant 1 missed PreCommit and Commit, and Participant 2 committed and crashed with the coordinator.
+    # Participant 1 cannot tell that from nobody having pre-committed, so it blocks instead of aborting.
+    run.injector.drop('PreCommit', 'Participant 1')
+    run.injector.drop('Commit', 'Participant 1')
+    transaction_id = run.begin()
+    run.coordinator.initialize_transaction(transaction_id)
+    wait_until(lambda: run.cluster.participant_states(transaction_id)[1] == 'COMMITTED', coordinator.TIMEOUT)
+    run.failed()
+    run.cluster.crash_coordinator()
+    run.cluster.crash_participant(1)
+    if wait_until(lambda: run.cluster.participant_states(transaction_id)[0] != 'PREPARED',
+                  participant.TIMEOUT * 2 + participant.PEER_QUERY_TIMEOUT * 2):
+        raise AssertionError(f'Participant 1 left PREPARED with a peer down: {run.cluster.participant_states(transaction_id)}')
+    run.restart_participant(1)
+    run.cluster.wait_resolved(transaction_id, participant.TIMEOUT * 2 + participant.PEER_QUERY_TIMEOUT * 2)
+    run.restart_coordinator()
+    return transaction_id, 'COMMITTED'
+
+
+def check_atomicity(cluster, transaction_id, expected):
+    states = cluster.participant_states(transaction_id)
+    decision, _ = cluster.coordinator.get_transaction_state(transaction_id)
+    if len(set(states)) != 1 or states[0] not in FINAL_STATES:
+        return f'participants disagree: {states}'
+    if states[0] != expected:
+        return f'expected {expected}, participants {states[0]}'
+    if decision != expected:
+        return f'participants {states[0]}, coordinator {decision}'
+    return None
+
+
+def run_scenario(name, size, resolve_timeout):
+    injector = faults.FaultInjector().install()
+    cluster = LocalCluster(size, injector, three_phase=getattr(SCENARIOS[name], 'three_phase', False)).start()
+    run = Run(cluster, injector)
+    try:
+        transaction_id, expected = SCENARIOS[name](run)
+        resolved = wait_until(lambda: cluster.resolved(transaction_id) and
+                              cluster.coordinator.get_transaction_state(transaction_id)[0] in FINAL_STATES,
+                              resolve_timeout)
+        resolved_at = time.monotonic()
+        error = check_atomicity(cluster, transaction_id, expected) if resolved else 'not resolved in time'
+        blocked = resolved_at - run.failed_at if run.failed_at else 0.0
+        recovery = resolved_at - run.restarted_at if run.restarted_at else 0.0
+        return {'scenario': name, 'outcome': expected, 'error': error, 'blocked': blocked, 'recovery': recovery}
+    except Exception as e:
+        logging.exception(f'Scenario {name} failed')
+        return {'scenario': name, 'outcome': '-', 'error': repr(e), 'blocked': 0.0, 'recovery': 0.0}
+    finally:
+        injector.uninstall()
+        cluster.stop()
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Run fault-injection scenarios against an in-process cluster')
+    parser.add_argument('scenarios', nargs='*', help=f'Scenarios to run (default: all): {", ".join(SCENARIOS)}')
+    parser.add_argument('--participants', type=int, default=2, help='Number of participants')
+    parser.add_argument('--timeout', type=float, default=1.0, help='Coordinator and participant timeout in seconds')
+    parser.add_argument('--resolve-timeout', type=float, default=10.0, help='Seconds to wait for a scenario to resolve')
+    parser.add_argument('--verbose', action='store_true', help='Show node logs')
+    args = parser.parse_args()
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f'unknown scenario(s): {", ".join(unknown)}')
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.CRITICAL,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    coordinator.TIMEOUT = participant.TIMEOUT = args.timeout
+
+    results = [run_scenario(name, args.participants, args.resolve_timeout) for name in args.scenarios or SCENARIOS]
+    print(f'{"scenario":<46} {"outcome":<10} {"blocked ms":>10} {"recovery ms":>11}  result')
+    for result in results:
+        status = 'ok' if result['error'] is None else f'FAIL: {result["error"]}'
+        print(f'{result["scenario"]:<46} {result["outcome"]:<10} {result["blocked"] * 1000:>10.1f} '
+              f'{result["recovery"] * 1000:>11.1f}  {status}')
+    return 0 if all(result['error'] is None for result in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
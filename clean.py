@@ -2,7 +2,7 @@ import os
 import glob
 
 def cleanup_files():
-    files = glob.glob('*.log') + glob.glob('*.db') + glob.glob('*_pb2.py') + glob.glob('*_pb2_grpc.py')
+    files = glob.glob('*.log') + glob.glob('*.db') + glob.glob('*.db-wal') + glob.glob('*.db-shm') + glob.glob('*_pb2.py') + glob.glob('*_pb2_grpc.py')
     for file in files:
         try:
             os.remove(file)
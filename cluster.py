@@ -0,0 +1,131 @@
+import grpc
+from concurrent import futures
+import tempfile
+import logging
+import shutil
+import socket
+import time
+import os
+import coordinator
+import participant
+import profiling
+import twopc_pb2_grpc
+
+POLL_INTERVAL = 0.005  # seconds between checks while waiting for a condition
+FINAL_STATES = ('COMMITTED', 'ABORTED')
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('localhost', 0))
+        return s.getsockname()[1]
+
+
+def wait_until(predicate, timeout):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(POLL_INTERVAL)
+    return True
+
+
+class LocalCluster:
+    """A coordinator and N participants running as gRPC servers inside this process.
+
+    Everything lives in a fresh working directory (the process chdirs into it, since
+    the nodes keep their databases and WALs in the current directory); stop() returns
+    to the previous directory and removes a directory it created. Nodes can be
+    crashed and restarted individually; a restart builds a new object, so it goes
+    through the same recovery path as a restarted process.
+    """
+
+    def __init__(self, size=2, injector=None, workdir=None, streaming=False, three_phase=False, transport=None):
+        self.injector = injector
+        self.streaming = streaming
+        self.three_phase = three_phase
+        self.transport = transport
+        self.owns_workdir = workdir is None
+        self.workdir = os.path.abspath(workdir or tempfile.mkdtemp(prefix='twopc-cluster-'))
+        self.previous_dir = os.getcwd()
+        os.chdir(self.workdir)
+        self.coordinator_port = free_port()
+        self.coordinator_address = f'localhost:{self.coordinator_port}'
+        self.participant_ports = [free_port() for _ in range(size)]
+        self.participant_addresses = [f'localhost:{port}' for port in self.participant_ports]
+        self.participants = [None] * size
+        self.participant_servers = [None] * size
+        self.coordinator = None
+        self.coordinator_server = None
+
+    def start(self):
+        for i in range(len(self.participants)):
+            self.start_participant(i)
+        self.start_coordinator()
+        return self
+
+    def participant_name(self, i):
+        return f'Participant {i + 1}'
+
+    def start_participant(self, i):
+        interceptors = [self.injector.interceptor(self.participant_name(i))] if self.injector else []
+        interceptors.append(profiling.interceptor('participant'))
+        options = self.transport.options() if self.transport else []
+        server = grpc.server(futures.ThreadPoolExecutor(max_workers=10), interceptors=interceptors, options=options)
+        # An absolute path, so the database stays in the workdir whatever the current directory
+        db_name = os.path.join(self.workdir, f'participant{i + 1}.db')
+        node = participant.Participant(self.participant_name(i), db_name, self.participant_ports[i],
+                                       self.coordinator_address, self.transport)
+        twopc_pb2_grpc.add_TwoPCServicer_to_server(node, server)
+        server.add_insecure_port(f'[::]:{self.participant_ports[i]}')
+        server.start()
+        self.participants[i] = node
+        self.participant_servers[i] = server
+        return node
+
+    def start_coordinator(self):
+        self.coordinator = coordinator.TransactionCoordinator(self.participant_addresses, self.coordinator_port,
+                                                              self.streaming, three_phase=self.three_phase,
+                                                              transport=self.transport)
+        self.coordinator_server = self.coordinator.start_server()
+        return self.coordinator
+
+    def crash_coordinator(self, lose_unsynced=False):
+        if self.injector:
+            self.injector.kill(self.coordinator)
+            if lose_unsynced:
+                self.injector.lose_unsynced(coordinator.LOG_FILE)
+        self.coordinator_server.stop(0)
+        self.coordinator = None
+
+    def crash_participant(self, i, lose_unsynced=False):
+        node = self.participants[i]
+        if self.injector:
+            self.injector.kill(node)
+            if lose_unsynced:
+                self.injector.lose_unsynced(node.log_file)
+        self.participant_servers[i].stop(0)
+        node.close()
+        self.participants[i] = None
+
+    def participant_states(self, transaction_id):
+        return [node.get_transaction_state(transaction_id) if node else None for node in self.participants]
+
+    def resolved(self, transaction_id):
+        states = self.participant_states(transaction_id)
+        return all(state in FINAL_STATES for state in states)
+
+    def wait_resolved(self, transaction_id, timeout):
+        return wait_until(lambda: self.resolved(transaction_id), timeout)
+
+    def stop(self):
+        for server in self.participant_servers + [self.coordinator_server]:
+            if server is not None:
+                server.stop(0)
+        for node in self.participants:
+            if node is not None:
+                node.close()
+        os.chdir(self.previous_dir)
+        if self.owns_workdir:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+        logging.info(f'Cluster in {self.workdir} stopped')
@@ -3,147 +3,399 @@ from concurrent import futures
 import time
 import twopc_pb2
 import twopc_pb2_grpc
+from admission import AdmissionController, MAX_IN_FLIGHT, MAX_QUEUE, QUEUE_TIMEOUT, TARGET_LATENCY
+from transport import Transport, ALGORITHMS, COMPRESSION_THRESHOLD, CHUNK_SIZE
+from txid import TransactionIdGenerator, id_at
+import wal
+import faults
+import profiling
+import readiness
 import sqlite3
 import logging
 import threading
+import functools
+import contextlib
+import collections
+import queue
 import os
 
 TIMEOUT = 10  # 10 seconds timeout
 LOG_FILE = 'coordinator_wal.log'
+DB_FILE = 'coordinator.db'
+TERMINAL_STATES = ('COMMITTED', 'ABORTED')
+UNDECIDED_STATES = (None, 'INITIALIZED', 'STARTED', 'PRECOMMITTING')  # States from which either outcome can still be decided
+ABORT_STATES = ('ABORTING', 'ABORTED')
+ADMIN_WORKERS = 4  # Server threads beyond admitted and queued transactions, for FetchCommit, GetMetrics and admin RPCs
+LIST_BATCH = 500  # Rows fetched at a time while streaming ListTransactions
+RETENTION = 24 * 3600  # seconds finished transactions are kept before truncation; 0 keeps them forever
+TRUNCATE_INTERVAL = 60  # seconds between truncation passes
 
 class TransactionCoordinator(twopc_pb2_grpc.TwoPCServicer):
-    def __init__(self, participants, port):
+    def __init__(self, participants, port, streaming=False, admission=None, three_phase=False, transport=None,
+                 retention=RETENTION):
         self.participants = participants
         self.port = port
+        self.streaming = streaming
+        self.three_phase = three_phase
+        self.retention = retention
+        self.admission = admission or AdmissionController()
+        self.transport = transport or Transport()
         self.stubs = [self.create_stub(participant) for participant in participants]
         self.init_db()
-        self.lock = threading.Lock()
+        self.lock = profiling.InstrumentedLock(threading.Lock(), 'coordinator.lock')
+        self.active = self.load_active_transactions()
+        self.voting = set()  # Transactions whose start_transaction is still collecting votes
+        self.state_cache_hits = 0
+        self.state_cache_misses = 0
+        self.ids = TransactionIdGenerator(self.last_transaction_id())
+        self.ack_lock = profiling.InstrumentedLock(threading.Lock(), 'coordinator.ack_lock')
+        self.commit_progress = {}
+        self.ack_queue = queue.Queue()
+        threading.Thread(target=self.flush_acks, daemon=True).start()
         self.recover_from_log()
+        if retention:
+            threading.Thread(target=self.truncate_periodically, daemon=True).start()
 
     def create_stub(self, participant):
-        channel = grpc.insecure_channel(participant)
+        # Only the coordinator finishes transactions, so only its channels attribute bytes to them
+        channel = self.transport.channel(participant, track_transactions=True)
+        if self.streaming:
+            import streaming  # Only needed in streaming mode; kept off the startup path otherwise
+            return streaming.StreamingStub(channel, chunk_size=self.transport.chunk_size, stats=self.transport.stats,
+                                           compression=self.transport.compression)
         return twopc_pb2_grpc.TwoPCStub(channel)
 
     def init_db(self):
-        self.conn = sqlite3.connect('coordinator.db')
+        # The ack flusher thread writes through the same connection; self.lock serializes access.
+        # WAL journaling lets admin queries read on their own connections without blocking writes.
+        self.conn = sqlite3.connect(DB_FILE, check_same_thread=False)
         self.cursor = self.conn.cursor()
+        self.cursor.execute('PRAGMA journal_mode=WAL')
+        columns = self.cursor.execute('PRAGMA table_info(transactions)').fetchall()
+        if columns and columns[0][2] == 'TEXT':
+            # Tables from before coordinator-generated ids used free-form text keys; keep them aside
+            self.cursor.execute('ALTER TABLE transactions RENAME TO transactions_text_ids')
         self.cursor.execute('''CREATE TABLE IF NOT EXISTS transactions
-                               (id TEXT PRIMARY KEY, state TEXT, sent_to TEXT)''')
+                               (id INTEGER PRIMARY KEY, state TEXT, sent_to TEXT)''')
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS transactions_state ON transactions (state, id)')
         self.conn.commit()
 
-    def log_state(self, transaction_id, state, sent_to=None):
-        with open(LOG_FILE, 'a') as f:
-            sent_to_str = "," if sent_to is None else ",".join(map(str, sent_to))
-            f.write(f'{transaction_id},{state},{sent_to_str}\n')
+    def load_active_transactions(self):
+        # In-memory index of every transaction that has not reached a final state
+        self.cursor.execute('SELECT id, state, sent_to FROM transactions WHERE state NOT IN (?, ?)', TERMINAL_STATES)
+        return {transaction_id: (state, self.parse_sent_to(sent_to_str))
+                for transaction_id, state, sent_to_str in self.cursor.fetchall()}
+
+    def last_transaction_id(self):
+        self.cursor.execute('SELECT MAX(id) FROM transactions')
+        return self.cursor.fetchone()[0] or 0
+
+    def new_transaction_id(self):
+        return self.ids.next()
+
+    def parse_sent_to(self, sent_to_str):
+        return [] if sent_to_str == "," or sent_to_str == "" else list(map(int, sent_to_str.split(",")))
+
+    def log_state(self, transaction_id, state, sent_to=None, force=False):
+        wal.append(LOG_FILE, wal.encode(transaction_id, state, sent_to), force)
 
     def recover_from_log(self):
         if os.path.exists(LOG_FILE):
-            with open(LOG_FILE, 'r') as f:
-                for line in f:
-                    parts = line.strip().split(',')
-                    transaction_id = parts[0]
-                    state = parts[1]
-                    sent_to_str = "," if len(parts) < 3 else parts[2]
-                    sent_to = [] if sent_to_str == "," else [int(i) for i in sent_to_str.split(',') if i.isdigit()]
-                    self.store_transaction(transaction_id, state, sent_to, log=False)
+            records = [(record.transaction_id, wal.state_name(record), list(record.sent_to))
+                       for record in wal.read(LOG_FILE)]
+            self.store_transactions(records, log=False)
             os.remove(LOG_FILE)
         self.recover_incomplete_transactions()
 
-    def store_transaction(self, transaction_id, state, sent_to=None, log=True):
+    def index_transaction(self, transaction_id, state, sent_to):
+        if state in TERMINAL_STATES:
+            self.active.pop(transaction_id, None)
+        else:
+            self.active[transaction_id] = (state, list(sent_to or []))
+
+    def store_transaction(self, transaction_id, state, sent_to=None, log=True, force=False, expected=None):
+        # With `expected`, the write only happens if the current state is one of those states; returns whether it did
         with self.lock:
+            faults.check_alive(self)
+            if expected is not None and self.lookup_state(transaction_id)[0] not in expected:
+                return False
             if log:
-                self.log_state(transaction_id, state, sent_to)
+                with profiling.section('coordinator.wal.force' if force else 'coordinator.wal'):
+                    self.log_state(transaction_id, state, sent_to, force)
+                faults.crash_point(self, 'coordinator', state)
             sent_to_str = "," if sent_to is None else ",".join(map(str, sent_to))
-            self.cursor.execute('INSERT OR REPLACE INTO transactions (id, state, sent_to) VALUES (?, ?, ?)',
-                                (transaction_id, state, sent_to_str))
-            self.conn.commit()
+            with profiling.section('coordinator.sqlite.write'):
+                self.cursor.execute('INSERT OR REPLACE INTO transactions (id, state, sent_to) VALUES (?, ?, ?)',
+                                    (transaction_id, state, sent_to_str))
+                self.conn.commit()
+            self.index_transaction(transaction_id, state, sent_to)
+            return True
+
+    def store_transactions(self, records, log=True):
+        # Batched, non-forced variant of store_transaction: one WAL append and one SQLite commit
+        with self.lock:
+            faults.check_alive(self)
+            if log:
+                with profiling.section('coordinator.wal'):
+                    wal.append(LOG_FILE, b''.join(wal.encode(*record) for record in records))
+                for _, state, _ in records:
+                    faults.crash_point(self, 'coordinator', state)
+            rows = [(transaction_id, state, "," if sent_to is None else ",".join(map(str, sent_to)))
+                    for transaction_id, state, sent_to in records]
+            with profiling.section('coordinator.sqlite.write'):
+                self.cursor.executemany('INSERT OR REPLACE INTO transactions (id, state, sent_to) VALUES (?, ?, ?)', rows)
+                self.conn.commit()
+            for record in records:
+                self.index_transaction(*record)
 
     def get_transaction_state(self, transaction_id):
         with self.lock:
+            return self.lookup_state(transaction_id)
+
+    def lookup_state(self, transaction_id):
+        # Called with self.lock held
+        if transaction_id in self.active:
+            self.state_cache_hits += 1
+            state, sent_to = self.active[transaction_id]
+            return state, list(sent_to)
+        self.state_cache_misses += 1
+        with profiling.section('coordinator.sqlite.read'):
             self.cursor.execute('SELECT state, sent_to FROM transactions WHERE id = ?', (transaction_id,))
             row = self.cursor.fetchone()
-            if row:
-                state, sent_to_str = row
-                sent_to = [] if sent_to_str == "," or sent_to_str == "" else list(map(int, sent_to_str.split(",")))
-                return state, sent_to
-            return None, []
+        if row:
+            state, sent_to_str = row
+            return state, self.parse_sent_to(sent_to_str)
+        return None, []
 
-    def recover_incomplete_transactions(self):
-        self.cursor.execute('SELECT id FROM transactions WHERE state = "COMMITTING"')
-        transactions = self.cursor.fetchall()
-        for transaction_id in transactions:
-            self.commit_transaction(transaction_id[0])
+    def list_transactions(self, states, after_id=0, limit=0):
+        # In-flight states are answered from the in-memory index, holding self.lock only to copy it;
+        # everything else is read on a separate connection that never takes self.lock
+        if states and all(state not in TERMINAL_STATES for state in states):
+            with self.lock:
+                rows = [(transaction_id, state, list(sent_to)) for transaction_id, (state, sent_to) in self.active.items()
+                        if transaction_id > after_id and state in states]
+            rows.sort()
+            yield from rows[:limit] if limit else rows
+            return
+        query = 'SELECT id, state, sent_to FROM transactions WHERE id > ?'
+        params = [after_id]
+        if states:
+            query += f' AND state IN ({", ".join("?" * len(states))})'
+            params += states
+        query += ' ORDER BY id'
+        if limit:
+            query += ' LIMIT ?'
+            params.append(limit)
+        conn = sqlite3.connect(DB_FILE, check_same_thread=False)
+        try:
+            cursor = conn.execute(query, params)
+            for rows in iter(lambda: cursor.fetchmany(LIST_BATCH), []):
+                for transaction_id, state, sent_to_str in rows:
+                    yield transaction_id, state, self.parse_sent_to(sent_to_str)
+        finally:
+            conn.close()
 
-    def initialize_transaction(self, transaction_id):
-        self.store_transaction(transaction_id, 'INITIALIZED')
-        for stub in self.stubs:
+    def truncate_finished(self, before_id):
+        # Ids are insert-ordered, so everything finished below before_id goes in one range delete.
+        # Only COMMITTED (acked by every participant) and ABORTED rows are removed, so a later
+        # FetchCommit for a truncated id correctly presumes abort.
+        with self.lock:
+            faults.check_alive(self)
+            with profiling.section('coordinator.sqlite.write'):
+                self.cursor.execute('DELETE FROM transactions WHERE id < ? AND state IN (?, ?)',
+                                    (before_id,) + TERMINAL_STATES)
+                self.conn.commit()
+            return self.cursor.rowcount
+
+    def truncate_periodically(self):
+        # Ids are time-ordered, so "finished more than retention seconds ago" is an id range
+        while True:
+            time.sleep(TRUNCATE_INTERVAL)
             try:
-                logging.info(f'Coordinator: Sending Initialize request to participant for transaction {transaction_id}')
-                stub.Initialize.future(twopc_pb2.InitializeRequest(transaction_id=transaction_id)).result(timeout=TIMEOUT)
-            except grpc.RpcError as e:
-                logging.error(f'Error during initialize phase: {e}')
-                self.abort_transaction(transaction_id)
-                return
-            except grpc.FutureTimeoutError:
-                logging.error(f'Timeout during initialize phase for transaction {transaction_id}')
-                self.abort_transaction(transaction_id)
+                removed = self.truncate_finished(id_at(time.time() - self.retention))
+            except faults.InjectedCrash:
                 return
+            except Exception as e:
+                logging.error(f'Error truncating finished transactions: {e}')
+                continue
+            if removed:
+                logging.info(f'Coordinator: Truncated {removed} finished transactions')
 
-        self.start_transaction(transaction_id)
+    def recover_incomplete_transactions(self):
+        with self.lock:
+            transactions = list(self.active.items())
+        for transaction_id, (state, _) in transactions:
+            if state == 'COMMITTING':
+                self.commit_transaction(transaction_id)
+            elif state == 'PRECOMMITTING':
+                threading.Thread(target=self.precommit_transaction, args=(transaction_id,), daemon=True).start()
+            elif state in ('STARTED', 'ABORTING'):
+                # No commit decision was logged, so the outcome is abort; participants may be PREPARED
+                threading.Thread(target=self.abort_transaction, args=(transaction_id,), daemon=True).start()
 
-    def start_transaction(self, transaction_id):
-        state, _ = self.get_transaction_state(transaction_id)
-        if state != 'INITIALIZED':
+    def peers_of(self, participant):
+        return [address for i, address in enumerate(self.participants) if i != participant]
+
+    def initialize_transaction(self, transaction_id, payload=b''):
+        # Initialize rides on Prepare, so a transaction costs one round trip before the decision
+        return self.start_transaction(transaction_id, payload)
+
+    def start_transaction(self, transaction_id, payload=b''):
+        if not self.store_transaction(transaction_id, 'STARTED', expected=(None, 'INITIALIZED')):
             logging.error(f'Transaction {transaction_id} not initialized properly.')
-            return
+            return False
+        with self.lock:
+            self.voting.add(transaction_id)
+        try:
+            return self.collect_votes(transaction_id, payload)
+        finally:
+            with self.lock:
+                self.voting.discard(transaction_id)
 
-        self.store_transaction(transaction_id, 'STARTED')
+    def collect_votes(self, transaction_id, payload):
+        # Prepare goes to every participant at once; participants that have not seen the transaction
+        # initialize it, store the payload (the last write) and vote in a single step
+        calls = []
+        for i, stub in enumerate(self.stubs):
+            logging.info(f'Coordinator: Sending Prepare request to participant for transaction {transaction_id}')
+            request = twopc_pb2.VoteRequest(transaction_id=transaction_id, three_phase=self.three_phase, initialize=True,
+                                            peers=self.peers_of(i), payload=payload)
+            calls.append((stub.Prepare.future(request, timeout=TIMEOUT), time.monotonic()))
         votes = []
-        for stub in self.stubs:
+        for call, sent_at in calls:
             try:
-                logging.info(f'Coordinator: Sending Prepare request to participant for transaction {transaction_id}')
-                response = stub.Prepare.future(twopc_pb2.VoteRequest(transaction_id=transaction_id)).result(timeout=TIMEOUT)
+                response = call.result()
+                self.admission.record_latency(time.monotonic() - sent_at)
                 logging.info(f'Coordinator: Received Prepare response from participant for transaction {transaction_id}: {response.vote}')
                 votes.append(response.vote)
             except grpc.RpcError as e:
-                logging.error(f'Error during prepare phase: {e}')
-                self.abort_transaction(transaction_id)
-                return
-            except grpc.FutureTimeoutError:
-                logging.error(f'Timeout during prepare phase for transaction {transaction_id}')
+                if e.code() == grpc.StatusCode.DEADLINE_EXCEEDED:
+                    logging.error(f'Timeout during prepare phase for transaction {transaction_id}')
+                else:
+                    logging.error(f'Error during prepare phase: {e}')
                 self.abort_transaction(transaction_id)
-                return
+                return False
 
-        if all(votes):
-            self.commit_transaction(transaction_id)
+        if all(votes) and self.three_phase:
+            return self.precommit_transaction(transaction_id)
+        elif all(votes):
+            return self.commit_transaction(transaction_id)
         else:
             logging.info(f'Not all votes are yes, aborting transaction {transaction_id}')
             self.abort_transaction(transaction_id)
+            return False
+
+    def precommit_transaction(self, transaction_id):
+        # 3PC: once every participant is PRECOMMITTED they can finish without us if we fail
+        if not self.store_transaction(transaction_id, 'PRECOMMITTING', force=True, expected=('STARTED', 'PRECOMMITTING')):
+            logging.error(f'Transaction {transaction_id} was resolved elsewhere, not pre-committing it')
+            return False
+        request = twopc_pb2.PreCommitRequest(transaction_id=transaction_id)
+        logging.info(f'Coordinator: Sending PreCommit request to participants for transaction {transaction_id}')
+        calls = [stub.PreCommit.future(request, timeout=TIMEOUT) for stub in self.stubs]
+        for i, call in enumerate(calls):
+            try:
+                if not call.result().success:
+                    logging.info(f'Participant {i} refused PreCommit, aborting transaction {transaction_id}')
+                    self.abort_transaction(transaction_id)
+                    return False
+            except grpc.RpcError as e:
+                # A silent participant is treated as crashed; it learns the outcome when it recovers
+                logging.error(f'Error during precommit phase for transaction {transaction_id} on participant {i}: {e}')
+        return self.commit_transaction(transaction_id)
 
     def commit_transaction(self, transaction_id):
+        # Returns whether the transaction is committed; an abort that was already decided wins
         state, sent_to = self.get_transaction_state(transaction_id)
+        if state == 'COMMITTED':
+            return True
+        # Forced decision record: once this is on disk the outcome is fixed and the caller can be answered.
+        # It is checked and written under one lock, so a concurrent abort decision cannot be overwritten.
+        if state != 'COMMITTING' and not self.store_transaction(transaction_id, 'COMMITTING', sent_to, force=True,
+                                                                expected=UNDECIDED_STATES):
+            logging.error(f'Transaction {transaction_id} was already aborted, not committing it')
+            return False
 
-        for i, stub in enumerate(self.stubs):
-            if i in sent_to:
+        with self.ack_lock:
+            acked = self.commit_progress.setdefault(transaction_id, set())
+            acked.update(sent_to)
+            pending = [i for i in range(len(self.stubs)) if i not in acked]
+        if not pending:
+            self.record_commit_ack(transaction_id, None)
+            return True
+
+        # Fan out without waiting; acks are recorded asynchronously by the ack flusher
+        for i in pending:
+            logging.info(f'Coordinator: Sending Commit request to participant {i} for transaction {transaction_id}')
+            future = self.stubs[i].Commit.future(twopc_pb2.CommitRequest(transaction_id=transaction_id), timeout=TIMEOUT)
+            future.add_done_callback(functools.partial(self.on_commit_response, transaction_id, i, time.monotonic()))
+        return True
+
+    def on_commit_response(self, transaction_id, participant, sent_at, future):
+        try:
+            success = future.result().success
+            self.admission.record_latency(time.monotonic() - sent_at)
+        except grpc.RpcError as e:
+            if e.code() == grpc.StatusCode.DEADLINE_EXCEEDED:
+                logging.error(f'Timeout during commit phase for transaction {transaction_id} on participant {participant}')
+            else:
+                logging.error(f'Error committing transaction {transaction_id} on participant {participant}: {e}')
+            return
+        if not success:
+            # The participant had already aborted, e.g. by a heuristic decision; stay COMMITTING for an operator
+            logging.error(f'Participant {participant} refused to commit transaction {transaction_id}: outcomes diverged')
+            return
+        self.record_commit_ack(transaction_id, participant)
+
+    def record_commit_ack(self, transaction_id, participant):
+        with self.ack_lock:
+            acked = self.commit_progress.get(transaction_id)
+            if acked is None:
+                return
+            if participant is not None:
+                acked.add(participant)
+            if len(acked) == len(self.stubs):
+                del self.commit_progress[transaction_id]
+                record = (transaction_id, 'COMMITTED', None)
+            else:
+                record = (transaction_id, 'COMMITTING', sorted(acked))
+            # Enqueued under the lock so a transaction's records reach the flusher in the order they were built
+            self.ack_queue.put(record)
+
+    def flush_acks(self):
+        # Group commit for ack records. They are not forced: if they are lost, recovery resends
+        # Commit to the participants concerned, which is idempotent.
+        while True:
+            records = [self.ack_queue.get()]
+            while True:
+                try:
+                    records.append(self.ack_queue.get_nowait())
+                except queue.Empty:
+                    break
+            latest = {}
+            for record in records:
+                if latest.get(record[0], (None, None))[1] != 'COMMITTED':
+                    latest[record[0]] = record
+            with self.lock:
+                # Never downgrade: a COMMITTING record for a transaction that already finished is stale
+                records = [record for record in latest.values() if record[1] == 'COMMITTED' or record[0] in self.active]
+            if not records:
                 continue
             try:
-                logging.info(f'Coordinator: Sending Commit request to participant {i} for transaction {transaction_id}')
-                stub.Commit.future(twopc_pb2.CommitRequest(transaction_id=transaction_id)).result(timeout=TIMEOUT)
-                sent_to.append(i)
-                self.store_transaction(transaction_id, 'COMMITTING', sent_to)
-            except grpc.RpcError as e:
-                logging.error(f'Error committing transaction {transaction_id} on participant {i}: {e}')
-                continue
-            except grpc.FutureTimeoutError:
-                logging.error(f'Timeout during commit phase for transaction {transaction_id} on participant {i}')
+                self.store_transactions(records)
+            except Exception as e:
+                logging.error(f'Error recording commit acks: {e}')
                 continue
-
-        if len(sent_to) == len(self.stubs):
-            self.store_transaction(transaction_id, 'COMMITTED')
-            logging.info(f'Transaction {transaction_id} committed')
+            for transaction_id, state, _ in records:
+                if state == 'COMMITTED':
+                    self.transport.stats.finish(transaction_id)
+                    logging.info(f'Transaction {transaction_id} committed')
 
     def abort_transaction(self, transaction_id):
-        self.store_transaction(transaction_id, 'ABORTING')
+        # Returns whether the transaction is aborted; a commit that was already decided wins
+        if not self.store_transaction(transaction_id, 'ABORTING', expected=UNDECIDED_STATES + ABORT_STATES):
+            logging.error(f'Transaction {transaction_id} was already committed, not aborting it')
+            return False
         for stub in self.stubs:
             try:
                 logging.info(f'Coordinator: Sending Abort request to participant for transaction {transaction_id}')
@@ -153,35 +405,142 @@ class TransactionCoordinator(twopc_pb2_grpc.TwoPCServicer):
             except grpc.FutureTimeoutError:
                 logging.error(f'Timeout during abort phase for transaction {transaction_id}')
         self.store_transaction(transaction_id, 'ABORTED')
+        self.transport.stats.finish(transaction_id)
         logging.info(f'Transaction {transaction_id} aborted')
+        return True
+
+    @contextlib.contextmanager
+    def admitted(self, context, tenant_id):
+        ticket = self.admission.acquire(tenant_id)
+        if ticket is None:
+            context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, 'Coordinator is overloaded, retry later')
+        try:
+            yield
+        finally:
+            self.admission.release(ticket)
 
     def Prepare(self, request, context):
+        # Client entry point: answered once the outcome is durable, with vote=True meaning committed
         transaction_id = request.transaction_id
-        self.start_transaction(transaction_id)
-        return twopc_pb2.VoteResponse(vote=True)
+        with self.admitted(context, request.tenant_id):
+            committed = self.initialize_transaction(transaction_id, request.payload)
+        return twopc_pb2.VoteResponse(vote=committed)
 
     def Commit(self, request, context):
         transaction_id = request.transaction_id
-        self.commit_transaction(transaction_id)
-        return twopc_pb2.CommitResponse(success=True)
+        with self.admitted(context, request.tenant_id):
+            committed = self.commit_transaction(transaction_id)
+        return twopc_pb2.CommitResponse(success=committed)
 
     def Abort(self, request, context):
         transaction_id = request.transaction_id
-        self.abort_transaction(transaction_id)
-        return twopc_pb2.AbortResponse(success=True)
+        with self.admitted(context, request.tenant_id):
+            aborted = self.abort_transaction(transaction_id)
+        return twopc_pb2.AbortResponse(success=aborted)
+
+    def Begin(self, request, context):
+        return twopc_pb2.BeginResponse(transaction_id=self.new_transaction_id())
 
     def FetchCommit(self, request, context):
         transaction_id = request.transaction_id
         state, _ = self.get_transaction_state(transaction_id)
-        commit = state == 'COMMITTED'
-        return twopc_pb2.FetchCommitResponse(commit=commit)
+        if state is None:
+            state = 'ABORTED'  # Presumed abort: never seen, or finished and truncated
+        # The decision is durable once COMMITTING is logged, before every participant has acked
+        commit = state in ('COMMITTING', 'COMMITTED')
+        return twopc_pb2.FetchCommitResponse(commit=commit, state=twopc_pb2.State.Value(state))
+
+    def ListTransactions(self, request, context):
+        states = [twopc_pb2.State.Name(state) for state in request.states]
+        for transaction_id, state, sent_to in self.list_transactions(states, request.after_id, request.limit):
+            yield twopc_pb2.TransactionInfo(transaction_id=transaction_id, state=twopc_pb2.State.Value(state), acked=sent_to)
+
+    def ForceResolve(self, request, context):
+        transaction_id = request.transaction_id
+        outcome = twopc_pb2.State.Name(request.outcome)
+        if outcome not in ('UNKNOWN',) + TERMINAL_STATES:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, 'outcome must be COMMITTED, ABORTED or UNKNOWN')
+        state, _ = self.get_transaction_state(transaction_id)
+        with self.lock:
+            voting = transaction_id in self.voting
+        if voting:
+            # The live start_transaction decides as soon as the votes are in, or aborts at its timeout
+            context.abort(grpc.StatusCode.FAILED_PRECONDITION, f'Transaction {transaction_id} is still collecting votes')
+        decided = state in ('COMMITTING', 'COMMITTED')
+        # PRECOMMITTING is only logged after every vote was YES, but a participant may since have
+        # aborted on its own, so a commit from there re-runs PreCommit, which sees that refusal
+        if outcome == 'COMMITTED' and not decided and state != 'PRECOMMITTING':
+            context.abort(grpc.StatusCode.FAILED_PRECONDITION, f'Transaction {transaction_id} is {state} without a commit decision')
+        if outcome == 'ABORTED' and decided:
+            context.abort(grpc.StatusCode.FAILED_PRECONDITION, f'Transaction {transaction_id} is already {state}')
+        logging.warning(f'Coordinator: Force-resolving transaction {transaction_id} ({state}) to {outcome}')
+        if decided:
+            self.commit_transaction(transaction_id)
+        elif state == 'PRECOMMITTING' and outcome in ('COMMITTED', 'UNKNOWN'):
+            if not self.precommit_transaction(transaction_id) and outcome == 'COMMITTED':
+                context.abort(grpc.StatusCode.FAILED_PRECONDITION, f'Transaction {transaction_id} could not be committed: '
+                                                                   f'it is now {self.get_transaction_state(transaction_id)[0]}')
+        else:
+            self.abort_transaction(transaction_id)
+        state, _ = self.get_transaction_state(transaction_id)
+        return twopc_pb2.OutcomeResponse(state=twopc_pb2.State.Value(state))
+
+    def storage_metrics(self):
+        with self.lock:
+            lookups = self.state_cache_hits + self.state_cache_misses
+            values = {
+                'transactions.active': len(self.active),
+                'state_cache.hits': self.state_cache_hits,
+                'state_cache.misses': self.state_cache_misses,
+                'state_cache.hit_rate': self.state_cache_hits / lookups if lookups else 0.0,
+            }
+            for state, count in collections.Counter(state for state, _ in self.active.values()).items():
+                values[f'transactions.{state}'] = count
+        with self.ack_lock:
+            values['commit.awaiting_acks'] = len(self.commit_progress)
+        values['commit.ack_queue_depth'] = self.ack_queue.qsize()
+        values['wal.bytes'] = os.path.getsize(LOG_FILE) if os.path.exists(LOG_FILE) else 0
+        return values
+
+    def GetMetrics(self, request, context):
+        values = self.admission.metrics()
+        values.update(self.storage_metrics())
+        values.update(self.transport.stats.metrics())
+        values.update(profiling.metrics())
+        return twopc_pb2.MetricsResponse(values=values)
 
-    def serve(self):
-        server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+    def Profile(self, request, context):
+        if request.enable:
+            profiling.start()
+            logging.info('Coordinator: Profiling started')
+            return twopc_pb2.ProfileResponse(running=True)
+        try:
+            output = profiling.report_path(request.output or f'coordinator-{self.port}-profile')
+        except ValueError as e:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        files = profiling.stop(output)
+        logging.info(f'Coordinator: Profiling stopped, wrote {", ".join(files)}')
+        return twopc_pb2.ProfileResponse(running=False, files=files)
+
+    def start_server(self):
+        # Enough threads for every admitted and queued transaction plus admin RPCs. The admission
+        # controller rejects the excess as soon as it arrives, so those calls hold a thread only briefly.
+        # There is no maximum_concurrent_rpcs: it caps every method, and a flood of Prepares would
+        # have gRPC reject FetchCommit and GetMetrics, which participants and operators need most then.
+        workers = self.admission.max_in_flight + self.admission.max_queue + ADMIN_WORKERS
+        server = grpc.server(futures.ThreadPoolExecutor(max_workers=workers),
+                             interceptors=[profiling.interceptor('coordinator')], options=self.transport.options())
         twopc_pb2_grpc.add_TwoPCServicer_to_server(self, server)
         server.add_insecure_port(f'[::]:{self.port}')
         server.start()
         logging.info(f'Transaction Coordinator started on port {self.port}')
+        return server
+
+    def serve(self, ready_file=None):
+        server = self.start_server()
+        if ready_file:
+            # Recovery ran in __init__, so the coordinator is fully up once the server accepts calls
+            readiness.mark_ready(ready_file)
         server.wait_for_termination()
 
 if __name__ == '__main__':
@@ -189,8 +548,39 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('participants', nargs='+', help='List of participant addresses (e.g., localhost:50051)')
     parser.add_argument('--port', type=int, default=50053, help='Port number for the coordinator')
+    parser.add_argument('--streaming', action='store_true', help='Multiplex protocol messages over one stream per participant')
+    parser.add_argument('--three-phase', action='store_true', help='Use three-phase commit (non-blocking) instead of 2PC')
+    parser.add_argument('--max-in-flight', type=int, default=MAX_IN_FLIGHT, help='Transactions processed concurrently')
+    parser.add_argument('--max-queue', type=int, default=MAX_QUEUE, help='Transactions waiting for a slot before new ones are rejected')
+    parser.add_argument('--queue-timeout', type=float, default=QUEUE_TIMEOUT, help='Seconds a transaction may wait for a slot')
+    parser.add_argument('--target-latency', type=float, default=TARGET_LATENCY, help='Participant latency (seconds) above which the in-flight limit shrinks')
+    parser.add_argument('--tenant-weight', action='append', default=[], metavar='TENANT=WEIGHT',
+                        help='Give a tenant its own admission queue with this share of slots (others share "default", weight 1; repeatable)')
+    parser.add_argument('--compression', choices=list(ALGORITHMS), default='none', help='Compression for large messages to participants')
+    parser.add_argument('--compression-threshold', type=int, default=COMPRESSION_THRESHOLD, help='Smallest message (bytes) that is compressed')
+    parser.add_argument('--max-message-size', type=int, help='Largest message (bytes) sent or received; gRPC default is 4 MB')
+    parser.add_argument('--window-size', type=int, help='HTTP/2 per-stream flow-control window (bytes); default adapts to bandwidth')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='With --streaming, Prepare payloads above this are sent in chunks')
+    parser.add_argument('--retention', type=float, default=RETENTION,
+                        help='Seconds finished transactions are kept before they are truncated (0 keeps them)')
+    parser.add_argument('--profile', metavar='OUTPUT', help='Profile from startup; writes OUTPUT.collapsed and OUTPUT.txt on exit')
+    parser.add_argument('--ready-file', help='File created once recovery is done and the server is accepting calls')
     args = parser.parse_args()
 
     logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-    coordinator = TransactionCoordinator(args.participants, args.port)
-    coordinator.serve()
+    if args.profile:
+        profiling.profile_until_exit(args.profile)
+    weights = {}
+    for entry in args.tenant_weight:
+        tenant, _, weight = entry.partition('=')
+        try:
+            weights[tenant] = float(weight)
+        except ValueError:
+            parser.error(f'--tenant-weight expects TENANT=WEIGHT, got {entry}')
+        if weights[tenant] <= 0:
+            parser.error(f'--tenant-weight for {tenant} must be positive')
+    admission = AdmissionController(args.max_in_flight, args.max_queue, args.queue_timeout, args.target_latency, weights)
+    transport = Transport(args.compression, args.compression_threshold, args.max_message_size, args.window_size, args.chunk_size)
+    coordinator = TransactionCoordinator(args.participants, args.port, args.streaming, admission, args.three_phase, transport,
+                                         args.retention)
+    coordinator.serve(args.ready_file)
@@ -0,0 +1,166 @@
+import grpc
+import threading
+import weakref
+import logging
+import os
+
+# The injector in effect for this process, or None. Nodes call the module-level hooks
+# below on every logging step; they cost one global lookup when no injector is installed.
+active = None
+
+
+class InjectedCrash(Exception):
+    pass
+
+
+def check_alive(node):
+    if active is not None:
+        active.check_alive(node)
+
+
+def crash_point(node, name, step):
+    if active is not None:
+        active.crash_point(node, name, step)
+
+
+def wal_appended(path, size, forced):
+    if active is not None:
+        active.wal_appended(path, size, forced)
+
+
+class Rule:
+    def __init__(self, method, target, action, phase, count):
+        self.method = method
+        self.target = target
+        self.action = action
+        self.phase = phase
+        self.count = count
+        self.gate = threading.Event()
+
+    def matches(self, method, target, phase):
+        return (self.count != 0 and self.phase == phase and self.method in (method, '*')
+                and self.target in (target, '*'))
+
+
+class FaultInjector:
+    """Deterministic failures for an in-process cluster.
+
+    Crash points are named '<node>:<STATE>' and fire right after that state's WAL
+    record is appended; the node is dead from then on and any further write it
+    attempts raises InjectedCrash. Message rules, applied by a server interceptor
+    on each participant, drop or hold a request before it is handled or its
+    response after it is handled. Held messages are released explicitly through
+    the rule's gate, so scenarios never rely on sleeping past a timeout. With
+    fsync loss, WAL bytes appended since the last forced write can be discarded.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.armed = set()
+        self.rules = []
+        self.dead = weakref.WeakSet()
+        self.crashed = threading.Event()
+        self.synced = {}
+
+    def install(self):
+        global active
+        active = self
+        return self
+
+    def uninstall(self):
+        global active
+        active = None
+        for rule in self.rules:
+            rule.gate.set()
+
+    def arm(self, point):
+        with self.lock:
+            self.armed.add(point)
+
+    def kill(self, node):
+        self.dead.add(node)
+        self.crashed.set()
+
+    def check_alive(self, node):
+        if node in self.dead:
+            raise InjectedCrash('node is down')
+
+    def crash_point(self, node, name, step):
+        point = f'{name}:{step}'
+        with self.lock:
+            if point not in self.armed:
+                return
+            self.armed.discard(point)
+        logging.warning(f'Fault injection: crashing {name} at {point}')
+        self.kill(node)
+        raise InjectedCrash(point)
+
+    def drop(self, method, target='*', phase='request', count=1):
+        return self.add_rule(Rule(method, target, 'drop', phase, count))
+
+    def hold(self, method, target='*', phase='request', count=1):
+        return self.add_rule(Rule(method, target, 'hold', phase, count))
+
+    def add_rule(self, rule):
+        with self.lock:
+            self.rules.append(rule)
+        return rule
+
+    def take_rule(self, method, target, phase):
+        with self.lock:
+            for rule in self.rules:
+                if rule.matches(method, target, phase):
+                    rule.count -= 1
+                    return rule
+        return None
+
+    def apply(self, method, target, phase, context):
+        rule = self.take_rule(method, target, phase)
+        if rule is None:
+            return
+        if rule.action == 'drop':
+            logging.warning(f'Fault injection: dropping {method} {phase} at {target}')
+            context.abort(grpc.StatusCode.UNAVAILABLE, f'{method} {phase} dropped by fault injection')
+        logging.warning(f'Fault injection: holding {method} {phase} at {target}')
+        rule.gate.wait()
+
+    def interceptor(self, target):
+        return FaultInterceptor(self, target)
+
+    def wal_appended(self, path, size, forced):
+        end = os.path.getsize(path)
+        with self.lock:
+            if forced:
+                self.synced[path] = end
+            else:
+                self.synced.setdefault(path, end - size)
+
+    def lose_unsynced(self, path):
+        # Simulates the page cache being lost with the machine: keep only what was fsync'd
+        with self.lock:
+            synced = self.synced.pop(path, None)
+        if synced is not None and os.path.exists(path) and os.path.getsize(path) > synced:
+            logging.warning(f'Fault injection: losing unsynced tail of {path}')
+            os.truncate(path, synced)
+
+
+class FaultInterceptor(grpc.ServerInterceptor):
+    def __init__(self, injector, target):
+        self.injector = injector
+        self.target = target
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None or handler.unary_unary is None:
+            return handler
+        method = handler_call_details.method.rsplit('/', 1)[-1]
+        behavior = handler.unary_unary
+
+        def faulty(request, context):
+            self.injector.apply(method, self.target, 'request', context)
+            response = behavior(request, context)
+            self.injector.apply(method, self.target, 'response', context)
+            return response
+
+        return grpc.unary_unary_rpc_method_handler(faulty, request_deserializer=handler.request_deserializer,
+                                                   response_serializer=handler.response_serializer)
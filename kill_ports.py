@@ -1,17 +1,17 @@
-import os
-import subprocess
+import psutil
 
 def kill_process_on_port(port):
-    try:
-        # Find the PID of the process using the port
-        result = subprocess.check_output(f'netstat -ano | findstr :{port}', shell=True).decode()
-        # Extract the PID from the result
-        pid = result.strip().split()[-1]
-        # Kill the process using the PID
-        subprocess.check_output(f'taskkill /PID {pid} /F', shell=True)
-        print(f'Process on port {port} (PID {pid}) has been terminated.')
-    except subprocess.CalledProcessError as e:
-        print(f'No process found running on port {port}.')
+    # psutil works the same on Linux, macOS and Windows (no netstat/taskkill parsing)
+    for proc in psutil.process_iter(['pid']):
+        try:
+            connections = proc.net_connections(kind='inet')
+        except (psutil.AccessDenied, psutil.NoSuchProcess):
+            continue
+        if any(conn.laddr and conn.laddr.port == port and conn.status == psutil.CONN_LISTEN for conn in connections):
+            proc.kill()
+            print(f'Process on port {port} (PID {proc.pid}) has been terminated.')
+            return
+    print(f'No process found running on port {port}.')
 
 if __name__ == '__main__':
     kill_process_on_port(50051)
@@ -0,0 +1,81 @@
+import subprocess
+import tempfile
+import time
+import sys
+import os
+import readiness
+
+READY_TIMEOUT = 30  # seconds a node may take to recover and start serving
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def start_node(name, script, args, ready_dir):
+    # Output goes to <name>.out.log in the working directory, next to the node's database and WAL
+    ready_file = os.path.join(ready_dir, f'{name}.ready')
+    readiness.clear_ready(ready_file)
+    with open(f'{name}.out.log', 'ab') as log:
+        process = subprocess.Popen([sys.executable, os.path.join(SCRIPT_DIR, script), *args, '--ready-file', ready_file],
+                                   stdout=log, stderr=subprocess.STDOUT)
+    return name, process, ready_file
+
+
+def wait_all_ready(nodes, timeout=READY_TIMEOUT):
+    deadline = time.monotonic() + timeout
+    for name, process, ready_file in nodes:
+        if not readiness.wait_ready(ready_file, max(0.0, deadline - time.monotonic()), process):
+            raise RuntimeError(f'{name} not ready after {timeout} seconds')
+
+
+def launch(participant_ports, coordinator_port=None, coordinator_args=(), ready_dir=None):
+    """Starts the participants in parallel, then the coordinator, each as its own process.
+
+    Returns once every node has recovered and is serving. The coordinator waits for the
+    participants because its recovery re-sends logged decisions to them straight away.
+    """
+    ready_dir = ready_dir or tempfile.mkdtemp(prefix='twopc-ready-')
+    coordinator_address = f'localhost:{coordinator_port or 50053}'
+    participants = [start_node(f'participant{i + 1}', 'participant.py',
+                               [str(port), f'Participant {i + 1}', f'participant{i + 1}.db', '--coordinator', coordinator_address],
+                               ready_dir)
+                    for i, port in enumerate(participant_ports)]
+    wait_all_ready(participants)
+    nodes = participants
+    if coordinator_port is not None:
+        addresses = [f'localhost:{port}' for port in participant_ports]
+        coordinator = start_node('coordinator', 'coordinator.py', [*addresses, '--port', str(coordinator_port), *coordinator_args],
+                                 ready_dir)
+        wait_all_ready([coordinator])
+        nodes = nodes + [coordinator]
+    return [(name, process) for name, process, _ in nodes]
+
+
+def stop(nodes):
+    for _, process in nodes:
+        process.terminate()
+    for _, process in nodes:
+        process.wait()
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Start a local cluster, one process per node, and wait until it is ready')
+    parser.add_argument('--participants', type=int, default=2, help='Number of participants')
+    parser.add_argument('--base-port', type=int, default=50051, help='Port of the first participant; the coordinator comes after the last')
+    parser.add_argument('--no-coordinator', action='store_true', help='Start only the participants')
+    parser.add_argument('--streaming', action='store_true', help='Start the coordinator with --streaming')
+    parser.add_argument('--three-phase', action='store_true', help='Start the coordinator with --three-phase')
+    args = parser.parse_args()
+
+    participant_ports = [args.base_port + i for i in range(args.participants)]
+    coordinator_port = None if args.no_coordinator else args.base_port + args.participants
+    coordinator_args = [flag for flag, enabled in (('--streaming', args.streaming), ('--three-phase', args.three_phase)) if enabled]
+    started = time.monotonic()
+    nodes = launch(participant_ports, coordinator_port, coordinator_args)
+    print(f'{len(nodes)} nodes ready in {(time.monotonic() - started) * 1000:.0f} ms '
+          f'(participants on {", ".join(map(str, participant_ports))}'
+          f'{f", coordinator on {coordinator_port}" if coordinator_port else ""}); Ctrl-C stops them')
+    try:
+        for _, process in nodes:
+            process.wait()
+    except KeyboardInterrupt:
+        stop(nodes)
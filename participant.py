@@ -4,122 +4,521 @@ import time
 import threading
 import twopc_pb2
 import twopc_pb2_grpc
+import wal
+import faults
+from transport import Transport, GRPC_MAX_MESSAGE_SIZE
+from txid import id_at
+import profiling
+import readiness
 import sqlite3
 import logging
+import queue
+import bisect
+import itertools
 import os
 
 TIMEOUT = 10  # 10 seconds timeout
+PEER_QUERY_TIMEOUT = 1  # seconds to wait for peers during cooperative termination
+SWEEP_INTERVAL = 0.25  # seconds between scans for transactions that have been unfinished longer than TIMEOUT
+RESOLVE_WORKERS = 4  # In-doubt transactions resolved concurrently by the sweeper
+FINAL_STATES = ('COMMITTED', 'ABORTED')
+IN_DOUBT_STATES = ('PREPARED', 'PRECOMMITTED')
 LOG_FILE_TEMPLATE = 'participant_{}_wal.log'
+LIST_BATCH = 500  # Rows fetched at a time while streaming ListTransactions
+SNAPSHOT_CHUNK_BYTES = 1024 * 1024  # Largest Snapshot message, unless the transport's message limit is lower
+SNAPSHOT_FETCH_ROWS = 20000  # Rows read from SQLite at a time while building Snapshot messages
+SNAPSHOT_ROW_OVERHEAD = 32  # Upper bound on the encoded bytes a row adds besides its peers or payload
+SNAPSHOT_MESSAGE_MARGIN = 1024  # Bytes kept below the message size limit for the message envelope
+STATE_VALUES = dict(twopc_pb2.State.items())
+STATE_NAMES = {value: name for name, value in STATE_VALUES.items()}
+CHANNEL_WORKERS = 10  # Handlers run concurrently for messages arriving on a Channel stream
+CHANNEL_HANDLERS = {
+    'initialize': ('Initialize', 'initialize_response'),
+    'prepare': ('Prepare', 'prepare_response'),
+    'precommit': ('PreCommit', 'precommit_response'),
+    'commit': ('Commit', 'commit_response'),
+    'abort': ('Abort', 'abort_response'),
+}
+
+def split_by_size(rows, sizes, limit):
+    # Slices rows into runs of at most `limit` bytes, given the running total of their sizes
+    start, base = 0, 0
+    while start < len(rows):
+        end = max(bisect.bisect_right(sizes, base + limit, start), start + 1)
+        yield rows[start:end]
+        base, start = sizes[end - 1], end
 
 class Participant(twopc_pb2_grpc.TwoPCServicer):
-    def __init__(self, node_name, db_name, port):
+    def __init__(self, node_name, db_name, port, coordinator_address='localhost:50053', transport=None,
+                 bootstrap_from=None, address=None):
         self.node_name = node_name
         self.db_name = db_name
         self.port = port
+        self.coordinator_address = coordinator_address
+        self.transport = transport or Transport()
         self.log_file = LOG_FILE_TEMPLATE.format(port)
         self.db_access_restricted = False
         self.init_db()
-        self.lock = threading.Lock()
-        self.transaction_timeouts = {}
-        self.recover_from_log()
+        # Reentrant: the transaction timeout checks and updates state while holding it
+        self.lock = profiling.InstrumentedLock(threading.RLock(), 'participant.lock')
+        self.peer_stubs = {}
+        self.channel_executor = futures.ThreadPoolExecutor(max_workers=CHANNEL_WORKERS)
+        self.channel_lock = threading.Lock()
+        self.channel_pending = 0  # Channel messages submitted to channel_executor and not yet handled
+        # A bootstrap replaces the database and the stale local log first, so recovery runs once, over the snapshot
+        in_doubt = self.bootstrap(bootstrap_from, address or f'localhost:{port}') if bootstrap_from else ()
+        self.retry_at = {}  # In-doubt transactions that could not be resolved -> when to try again (monotonic)
+        self.resolving = set()  # In-doubt transactions submitted to the resolver and not yet finished
+        self.sweep_lock = threading.Lock()
+        self.recover_from_log(in_doubt)
+        self.closed = threading.Event()
+        self.resolver = futures.ThreadPoolExecutor(max_workers=RESOLVE_WORKERS)
+        self.sweeper = threading.Thread(target=self.sweep, daemon=True)
+        self.sweeper.start()
 
-    def init_db(self):
-        conn = sqlite3.connect(self.db_name)
+    def init_db(self, db_name=None):
+        conn = sqlite3.connect(db_name or self.db_name)
         cursor = conn.cursor()
+        # WAL journaling lets admin queries read without holding up the protocol's writes
+        cursor.execute('PRAGMA journal_mode=WAL')
+        columns = cursor.execute('PRAGMA table_info(transactions)').fetchall()
+        if columns and columns[0][2] == 'TEXT':
+            # Tables from before coordinator-generated ids used free-form text keys; keep them aside
+            cursor.execute('ALTER TABLE transactions RENAME TO transactions_text_ids')
         cursor.execute('''CREATE TABLE IF NOT EXISTS transactions
-                          (id TEXT PRIMARY KEY, state TEXT)''')
+                          (id INTEGER PRIMARY KEY, state TEXT, peers TEXT, three_phase INTEGER)''')
+        columns = [column[1] for column in cursor.execute('PRAGMA table_info(transactions)')]
+        if 'peers' not in columns:
+            cursor.execute('ALTER TABLE transactions ADD COLUMN peers TEXT')
+        if 'three_phase' not in columns:
+            cursor.execute('ALTER TABLE transactions ADD COLUMN three_phase INTEGER')
+        cursor.execute('CREATE INDEX IF NOT EXISTS transactions_state ON transactions (state, id)')
+        cursor.execute('''CREATE TABLE IF NOT EXISTS data
+                          (transaction_id INTEGER PRIMARY KEY, payload BLOB)''')
         conn.commit()
         conn.close()
 
-    def log_state(self, transaction_id, state):
-        with open(self.log_file, 'a') as f:
-            f.write(f'{transaction_id},{state}\n')
+    def log_state(self, transaction_id, state, peers=None, three_phase=None, payload=None):
+        wal.append(self.log_file, wal.encode(transaction_id, state, peers=peers, three_phase=bool(three_phase),
+                                             payload=payload))
 
-    def recover_from_log(self):
+    def recover_from_log(self, in_doubt=()):
+        # in_doubt: transactions already in the database that must be settled too, e.g. from a bootstrap
+        states = dict.fromkeys(in_doubt, 'PREPARED')  # Any in-doubt state; records in the log replace it
+        if os.path.exists(self.log_file):
+            for record in wal.read(self.log_file):
+                states[record.transaction_id] = wal.state_name(record)
+                self.store_transaction(record.transaction_id, states[record.transaction_id], list(record.peers) or None,
+                                       log=False, three_phase=record.three_phase or None, payload=record.payload or None)
+        for transaction_id, state in states.items():
+            if state in IN_DOUBT_STATES and not self.resolve_in_doubt(transaction_id):
+                self.retry_at[transaction_id] = time.monotonic() + TIMEOUT
         if os.path.exists(self.log_file):
-            with open(self.log_file, 'r') as f:
-                for line in f:
-                    parts = line.strip().split(',')
-                    transaction_id = parts[0]
-                    state = parts[1]
-                    self.store_transaction(transaction_id, state, log=False)
-                    if state == 'PREPARED':
-                        self.fetch_commit(transaction_id)
             os.remove(self.log_file)
 
+    def resolve_in_doubt(self, transaction_id):
+        decision = self.fetch_commit(transaction_id)
+        if decision in FINAL_STATES:
+            outcome = decision
+        elif not self.is_three_phase(transaction_id):
+            outcome = self.terminate_two_phase(transaction_id)
+        elif decision is None:
+            outcome = self.terminate_three_phase(transaction_id)
+        else:
+            # A live 3PC coordinator finishes the protocol itself; terminating around it could race its PreCommit
+            outcome = None
+        if outcome is None:
+            logging.info(f'{self.node_name}: Transaction {transaction_id} still in doubt')
+            return False
+        self.store_transaction(transaction_id, outcome)
+        logging.info(f'{self.node_name}: Transaction {transaction_id} {outcome.lower()} after resolving its in-doubt state')
+        return True
+
     def fetch_commit(self, transaction_id):
-        coordinator_address = f'localhost:{self.port}'
-        channel = grpc.insecure_channel(coordinator_address)
+        # Returns the coordinator's view (COMMITTED, ABORTED or a pending state), or None if it is down
+        channel = self.transport.channel(self.coordinator_address)
         stub = twopc_pb2_grpc.TwoPCStub(channel)
         logging.info(f'{self.node_name}: Fetching commit information for transaction {transaction_id} from coordinator')
-        response = stub.FetchCommit(twopc_pb2.FetchCommitRequest(transaction_id=transaction_id))
+        try:
+            response = stub.FetchCommit(twopc_pb2.FetchCommitRequest(transaction_id=transaction_id), timeout=TIMEOUT)
+        except grpc.RpcError as e:
+            if e.code() not in (grpc.StatusCode.UNAVAILABLE, grpc.StatusCode.DEADLINE_EXCEEDED):
+                # It answered, e.g. RESOURCE_EXHAUSTED under load, so it is alive and still owns the outcome
+                logging.warning(f'{self.node_name}: Coordinator could not answer for transaction {transaction_id}: {e.code()}')
+                return 'UNKNOWN'
+            logging.error(f'{self.node_name}: Could not reach coordinator for transaction {transaction_id}: {e}')
+            return None
+        finally:
+            channel.close()
+        state = twopc_pb2.State.Name(response.state)
         if response.commit:
-            self.store_transaction(transaction_id, 'COMMITTED')
-            logging.info(f'{self.node_name}: Transaction {transaction_id} committed after recovery')
-        else:
-            self.store_transaction(transaction_id, 'ABORTED')
-            logging.info(f'{self.node_name}: Transaction {transaction_id} aborted after recovery')
+            return 'COMMITTED'
+        if state in ('ABORTING', 'ABORTED'):
+            return 'ABORTED'
+        return state
+
+    def peer_stub(self, address):
+        if address not in self.peer_stubs:
+            self.peer_stubs[address] = twopc_pb2_grpc.TwoPCStub(self.transport.channel(address))
+        return self.peer_stubs[address]
+
+    def query_peers(self, transaction_id):
+        # States reported by the other participants; None for a peer that did not answer in time
+        peers = self.get_transaction_peers(transaction_id)
+        if not peers:
+            return []
+        logging.info(f'{self.node_name}: Asking peers {peers} about transaction {transaction_id}')
+        request = twopc_pb2.FetchCommitRequest(transaction_id=transaction_id)
+        # All queries are in flight at once and share one deadline
+        calls = [self.peer_stub(peer).QueryOutcome.future(request, timeout=PEER_QUERY_TIMEOUT) for peer in peers]
+        states = []
+        for call in calls:
+            try:
+                states.append(twopc_pb2.State.Name(call.result().state))
+            except grpc.RpcError:
+                states.append(None)
+        return states
+
+    def terminate_two_phase(self, transaction_id):
+        # Cooperative termination: any peer that knows the outcome, or that never voted YES
+        # (and therefore aborts on the spot), settles it. If all are PREPARED we stay blocked.
+        for state in self.query_peers(transaction_id):
+            if state in FINAL_STATES:
+                return state
+        return None
+
+    def terminate_three_phase(self, transaction_id):
+        # 3PC termination without the coordinator, assuming crash failures and no partitions.
+        # The coordinator commits once every participant that answered PreCommit has pre-committed,
+        # so a peer that does not answer now may have pre-committed or committed without us.
+        peer_states = self.query_peers(transaction_id)
+        for state in FINAL_STATES:
+            if state in peer_states:
+                return state
+        if self.get_transaction_state(transaction_id) == 'PREPARED':
+            if None in peer_states and 'PRECOMMITTED' not in peer_states:
+                return None
+            if 'PRECOMMITTED' not in peer_states:
+                # Every peer answered and none has pre-committed, so no PreCommit reached anybody
+                return 'ABORTED'
+            self.store_transaction(transaction_id, 'PRECOMMITTED')
+        if all(state == 'PRECOMMITTED' for state in peer_states):
+            # Everybody pre-committed, so every vote was YES and nobody can abort any more
+            return 'COMMITTED'
+        return None
+
+    def sweep(self):
+        # One thread per node finds timed-out transactions through the (state, id) index instead of a
+        # timer per transaction. Ids are time-ordered, so rows older than TIMEOUT have ids below a cutoff.
+        while not self.closed.wait(SWEEP_INTERVAL):
+            try:
+                faults.check_alive(self)
+            except faults.InjectedCrash:
+                return
+            if self.db_access_restricted:
+                continue
+            cutoff = id_at(time.time() - TIMEOUT)
+            conn = sqlite3.connect(self.db_name)
+            try:
+                rows = conn.execute('SELECT id, state FROM transactions WHERE state IN (?, ?, ?) AND id < ?',
+                                    ('INITIALIZED',) + IN_DOUBT_STATES + (cutoff,)).fetchall()
+            except sqlite3.Error as e:
+                logging.error(f'{self.node_name}: Could not scan for timed-out transactions: {e}')
+                continue
+            finally:
+                conn.close()
+            now = time.monotonic()
+            with self.sweep_lock:
+                self.retry_at = {transaction_id: self.retry_at[transaction_id]
+                                 for transaction_id, _ in rows if transaction_id in self.retry_at}
+                due = [(transaction_id, state) for transaction_id, state in rows
+                       if transaction_id not in self.resolving and self.retry_at.get(transaction_id, 0) <= now]
+                self.resolving.update(transaction_id for transaction_id, state in due if state != 'INITIALIZED')
+            for transaction_id, state in due:
+                if state == 'INITIALIZED':
+                    self.abort_unprepared(transaction_id)
+                else:
+                    self.resolver.submit(self.retry_in_doubt, transaction_id)
+
+    def abort_unprepared(self, transaction_id):
+        try:
+            with self.lock:
+                if self.get_transaction_state(transaction_id) == 'INITIALIZED':
+                    self.store_transaction(transaction_id, 'ABORTED')
+                    logging.info(f'{self.node_name}: Aborted transaction {transaction_id} due to timeout')
+        except faults.InjectedCrash:
+            pass
+
+    def retry_in_doubt(self, transaction_id):
+        resolved = False
+        try:
+            resolved = self.get_transaction_state(transaction_id) not in IN_DOUBT_STATES or \
+                self.resolve_in_doubt(transaction_id)
+        except faults.InjectedCrash:
+            pass
+        finally:
+            with self.sweep_lock:
+                self.resolving.discard(transaction_id)
+                if not resolved:
+                    self.retry_at[transaction_id] = time.monotonic() + TIMEOUT
 
-    def store_transaction(self, transaction_id, state, log=True):
+    def close(self):
+        # Stops the node's background work; the server is stopped separately
+        self.closed.set()
+        self.sweeper.join()
+        self.resolver.shutdown(cancel_futures=True)
+        self.channel_executor.shutdown(cancel_futures=True)
+
+    def store_transaction(self, transaction_id, state, peers=None, log=True, three_phase=None, payload=None):
         with self.lock:
+            faults.check_alive(self)
             if log:
-                self.log_state(transaction_id, state)
+                with profiling.section('participant.wal'):
+                    self.log_state(transaction_id, state, peers, three_phase, payload)
+                faults.crash_point(self, self.node_name, state)
             if self.db_access_restricted:
                 logging.warning(f'{self.node_name}: Database access restricted, cannot store transaction {transaction_id}')
                 return
-            conn = sqlite3.connect(self.db_name)
-            cursor = conn.cursor()
-            cursor.execute('INSERT OR REPLACE INTO transactions (id, state) VALUES (?, ?)',
-                           (transaction_id, state))
-            conn.commit()
-            conn.close()
+            with profiling.section('participant.sqlite.write'):
+                conn = sqlite3.connect(self.db_name)
+                self.write_transaction(conn.cursor(), transaction_id, state, peers, three_phase, payload)
+                conn.commit()
+                conn.close()
+
+    def write_transaction(self, cursor, transaction_id, state, peers=None, three_phase=None, payload=None):
+        # Peers arrive with Initialize and the protocol with Prepare; later state changes keep them
+        cursor.execute('''INSERT INTO transactions (id, state, peers, three_phase) VALUES (?, ?, ?, ?)
+                          ON CONFLICT(id) DO UPDATE SET state = excluded.state, peers = COALESCE(excluded.peers, peers),
+                                                        three_phase = COALESCE(excluded.three_phase, three_phase)''',
+                       (transaction_id, state, None if peers is None else ','.join(peers), three_phase))
+        if payload is not None:
+            cursor.execute('INSERT OR REPLACE INTO data (transaction_id, payload) VALUES (?, ?)', (transaction_id, payload))
 
     def get_transaction_state(self, transaction_id):
         with self.lock:
             if self.db_access_restricted:
                 logging.warning(f'{self.node_name}: Database access restricted, cannot get transaction state for {transaction_id}')
                 return None
+            with profiling.section('participant.sqlite.read'):
+                conn = sqlite3.connect(self.db_name)
+                cursor = conn.cursor()
+                cursor.execute('SELECT state FROM transactions WHERE id = ?', (transaction_id,))
+                row = cursor.fetchone()
+                conn.close()
+            return row[0] if row else None
+
+    def get_transaction_peers(self, transaction_id):
+        with self.lock:
             conn = sqlite3.connect(self.db_name)
             cursor = conn.cursor()
-            cursor.execute('SELECT state FROM transactions WHERE id = ?', (transaction_id,))
+            cursor.execute('SELECT peers FROM transactions WHERE id = ?', (transaction_id,))
             row = cursor.fetchone()
             conn.close()
-            return row[0] if row else None
+            return row[0].split(',') if row and row[0] else []
 
-    def start_transaction_timeout(self, transaction_id):
-        def timeout():
-            time.sleep(TIMEOUT)
+    def is_three_phase(self, transaction_id):
+        with self.lock:
+            conn = sqlite3.connect(self.db_name)
+            cursor = conn.cursor()
+            cursor.execute('SELECT three_phase FROM transactions WHERE id = ?', (transaction_id,))
+            row = cursor.fetchone()
+            conn.close()
+            return bool(row and row[0])
+
+    def list_transactions(self, states, after_id=0, limit=0):
+        # Reads on its own connection without self.lock; the state index serves the filter
+        query = 'SELECT id, state, peers FROM transactions WHERE id > ?'
+        params = [after_id]
+        if states:
+            query += f' AND state IN ({", ".join("?" * len(states))})'
+            params += states
+        query += ' ORDER BY id'
+        if limit:
+            query += ' LIMIT ?'
+            params.append(limit)
+        conn = sqlite3.connect(self.db_name, check_same_thread=False)
+        try:
+            cursor = conn.execute(query, params)
+            for rows in iter(lambda: cursor.fetchmany(LIST_BATCH), []):
+                for transaction_id, state, peers in rows:
+                    yield transaction_id, state, peers.split(',') if peers else []
+        finally:
+            conn.close()
+
+    def snapshot_chunks(self):
+        # Every message stays below the transport's message size limit, so the receiver can accept it
+        limit = min(SNAPSHOT_CHUNK_BYTES, (self.transport.max_message_size or GRPC_MAX_MESSAGE_SIZE) - SNAPSHOT_MESSAGE_MARGIN)
+        conn = sqlite3.connect(self.db_name, check_same_thread=False)
+        try:
             with self.lock:
-                state = self.get_transaction_state(transaction_id)
-                if state == 'INITIALIZED':
-                    self.store_transaction(transaction_id, 'ABORTED')
-                    logging.info(f'{self.node_name}: Aborted transaction {transaction_id} due to timeout')
-        thread = threading.Thread(target=timeout)
-        thread.start()
-        self.transaction_timeouts[transaction_id] = thread
+                # Every write appends to the WAL log and commits to SQLite under self.lock, so the read
+                # snapshot pinned here and the log offset describe the same point
+                wal_offset = wal.size(self.log_file)
+                conn.execute('BEGIN')
+                conn.execute('SELECT 1 FROM transactions LIMIT 1').fetchall()
+            cursor = conn.execute('SELECT id, state, peers, three_phase FROM transactions ORDER BY id')
+            while rows := cursor.fetchmany(SNAPSHOT_FETCH_ROWS):
+                sizes = list(itertools.accumulate(len(row[2] or '') + SNAPSHOT_ROW_OVERHEAD for row in rows))
+                for part in split_by_size(rows, sizes, limit):
+                    ids, states, peers, three_phase = zip(*part)
+                    yield twopc_pb2.SnapshotChunk(transactions=twopc_pb2.TransactionRows(
+                        transaction_id=ids, state=[STATE_VALUES[state] for state in states],
+                        peers=[peer or '' for peer in peers], three_phase=[bool(flag) for flag in three_phase]))
+            cursor = conn.execute('SELECT transaction_id, payload FROM data ORDER BY transaction_id')
+            yield from self.data_chunks(cursor, limit - SNAPSHOT_ROW_OVERHEAD)
+            conn.rollback()
+        finally:
+            conn.close()
+        # Catch up with what was logged while the tables were being sent
+        if os.path.exists(self.log_file):
+            batch, size = [], 0
+            for record in wal.read(self.log_file, wal_offset):
+                record_size = record.ByteSize() + SNAPSHOT_ROW_OVERHEAD
+                if batch and (size + record_size > limit or record_size > limit):
+                    yield twopc_pb2.SnapshotChunk(wal_tail=batch)
+                    batch, size = [], 0
+                if record_size > limit:
+                    # The payload goes ahead as data rows; a record without one leaves the stored payload alone
+                    yield from self.data_chunks([(record.transaction_id, record.payload)], limit - SNAPSHOT_ROW_OVERHEAD)
+                    record.ClearField('payload')
+                    record_size = record.ByteSize() + SNAPSHOT_ROW_OVERHEAD
+                batch.append(record)
+                size += record_size
+            if batch:
+                yield twopc_pb2.SnapshotChunk(wal_tail=batch)
+
+    def data_chunks(self, rows, limit):
+        batch, size = [], 0
+        for transaction_id, payload in rows:
+            if batch and size + len(payload) > limit:
+                ids, payloads = zip(*batch)
+                yield twopc_pb2.SnapshotChunk(data=twopc_pb2.DataRows(transaction_id=ids, payload=payloads))
+                batch, size = [], 0
+            # A payload larger than one message goes out in pieces, each continued in the next chunk
+            while len(payload) > limit:
+                yield twopc_pb2.SnapshotChunk(data=twopc_pb2.DataRows(transaction_id=[transaction_id], payload=[payload[:limit]],
+                                                                      continued=True))
+                payload = payload[limit:]
+            batch.append((transaction_id, payload))
+            size += len(payload) + SNAPSHOT_ROW_OVERHEAD
+        if batch:
+            ids, payloads = zip(*batch)
+            yield twopc_pb2.SnapshotChunk(data=twopc_pb2.DataRows(transaction_id=ids, payload=payloads))
+
+    def bootstrap(self, source_address, address):
+        # Replaces the local database and log with a peer's snapshot; called from __init__ before recovery.
+        # Returns the transactions left in doubt, for recovery to settle
+        started = time.monotonic()
+        temporary = f'{self.db_name}.bootstrap'
+        for path in (temporary, f'{temporary}-wal', f'{temporary}-shm'):
+            if os.path.exists(path):
+                os.remove(path)
+        self.init_db(temporary)
+
+        def our_peers(peers):
+            # The source's peers plus the source itself, seen from this participant
+            return [peer for peer in dict.fromkeys(list(peers) + [source_address]) if peer != address] if peers else None
+
+        rewritten = {'': None}  # Stored peer lists repeat across rows, so each is rewritten once
+
+        def our_stored_peers(peers):
+            if peers not in rewritten:
+                rewritten[peers] = ','.join(our_peers(peers.split(',')))
+            return rewritten[peers]
+
+        counts = {'transactions': 0, 'data': 0, 'wal_tail': 0}
+        stub = twopc_pb2_grpc.TwoPCStub(self.transport.channel(source_address))
+        conn = sqlite3.connect(temporary)
+        cursor = conn.cursor()
+        continued = b''  # Leading pieces of a payload split across chunks
+        for chunk in stub.Snapshot(twopc_pb2.SnapshotRequest()):
+            rows = chunk.transactions
+            cursor.executemany('INSERT OR REPLACE INTO transactions (id, state, peers, three_phase) VALUES (?, ?, ?, ?)',
+                               zip(rows.transaction_id, [STATE_NAMES[state] for state in rows.state],
+                                   [our_stored_peers(peers) for peers in rows.peers], rows.three_phase))
+            ids, payloads = chunk.data.transaction_id, chunk.data.payload
+            if continued or chunk.data.continued:
+                ids, payloads = list(ids), list(payloads)
+                if payloads:
+                    payloads[0], continued = continued + payloads[0], b''
+                if chunk.data.continued:
+                    ids.pop()
+                    continued = payloads.pop()
+            cursor.executemany('INSERT OR REPLACE INTO data (transaction_id, payload) VALUES (?, ?)', zip(ids, payloads))
+            counts['data'] += len(ids)
+            for record in chunk.wal_tail:
+                self.write_transaction(cursor, record.transaction_id, wal.state_name(record), our_peers(record.peers),
+                                       record.three_phase or None, record.payload or None)
+            counts['transactions'] += len(rows.transaction_id)
+            counts['wal_tail'] += len(chunk.wal_tail)
+        # The source's undecided, unvoted transactions are not ours to vote on; a Prepare re-creates them
+        cursor.execute("DELETE FROM transactions WHERE state = 'INITIALIZED'")
+        in_doubt = [row[0] for row in cursor.execute('SELECT id FROM transactions WHERE state IN (?, ?)', IN_DOUBT_STATES)]
+        conn.commit()
+        conn.close()
+
+        # Swap the complete image in; stale SQLite WAL files and our own log must not be replayed over it
+        for path in (f'{self.db_name}-wal', f'{self.db_name}-shm', self.log_file):
+            if os.path.exists(path):
+                os.remove(path)
+        os.replace(temporary, self.db_name)
+        self.init_db()
+        logging.info(f'{self.node_name}: Bootstrapped from {source_address} in {(time.monotonic() - started) * 1000:.0f} ms: '
+                     f'{counts["transactions"]} transactions, {counts["data"]} payloads, {counts["wal_tail"]} WAL records, '
+                     f'{len(in_doubt)} in doubt')
+        return in_doubt
+
+    def count_unfinished(self):
+        conn = sqlite3.connect(self.db_name)
+        try:
+            return dict(conn.execute('SELECT state, COUNT(*) FROM transactions WHERE state IN (?, ?, ?) GROUP BY state',
+                                     ('INITIALIZED',) + IN_DOUBT_STATES).fetchall())
+        finally:
+            conn.close()
 
     def Initialize(self, request, context):
         transaction_id = request.transaction_id
         logging.info(f'{self.node_name}: Received Initialize request for transaction {transaction_id}')
-        self.store_transaction(transaction_id, 'INITIALIZED')
-        self.start_transaction_timeout(transaction_id)
+        self.store_transaction(transaction_id, 'INITIALIZED', list(request.peers))
         return twopc_pb2.Empty()
 
     def Prepare(self, request, context):
         transaction_id = request.transaction_id
         logging.info(f'{self.node_name}: Received Prepare request for transaction {transaction_id}')
-        state = self.get_transaction_state(transaction_id)
-        if self.db_access_restricted or state != 'INITIALIZED':
-            logging.info(f'{self.node_name}: Voting NO due to restricted database access or not initialized for transaction {transaction_id}')
-            return twopc_pb2.VoteResponse(vote=False)
-        self.store_transaction(transaction_id, 'PREPARED')
+        with self.lock:
+            # Checked and updated atomically so a peer's termination query cannot abort in between
+            state = self.get_transaction_state(transaction_id)
+            if request.initialize and state is None and not self.db_access_restricted:
+                # Initialize piggybacked on Prepare: go straight to PREPARED with a single record
+                state = 'INITIALIZED'
+            if self.db_access_restricted or state != 'INITIALIZED':
+                logging.info(f'{self.node_name}: Voting NO due to restricted database access or not initialized for transaction {transaction_id}')
+                return twopc_pb2.VoteResponse(vote=False)
+            self.store_transaction(transaction_id, 'PREPARED', list(request.peers) or None,
+                                   three_phase=request.three_phase or None, payload=request.payload or None)
         logging.info(f'{self.node_name}: Prepared for transaction {transaction_id}')
         return twopc_pb2.VoteResponse(vote=True)
 
+    def PreCommit(self, request, context):
+        transaction_id = request.transaction_id
+        logging.info(f'{self.node_name}: Received PreCommit request for transaction {transaction_id}')
+        with self.lock:
+            state = self.get_transaction_state(transaction_id)
+            if state == 'PREPARED':
+                self.store_transaction(transaction_id, 'PRECOMMITTED')
+        success = state in ('PREPARED', 'PRECOMMITTED', 'COMMITTED')
+        logging.info(f'{self.node_name}: PreCommit response for transaction {transaction_id}: {success}')
+        return twopc_pb2.PreCommitResponse(success=success)
+
     def Commit(self, request, context):
         transaction_id = request.transaction_id
         logging.info(f'{self.node_name}: Received Commit request for transaction {transaction_id}')
-        self.store_transaction(transaction_id, 'COMMITTED')
+        with self.lock:
+            if self.get_transaction_state(transaction_id) == 'ABORTED':
+                # Only a heuristic decision or a termination that lost a race can get here; keep the abort
+                logging.error(f'{self.node_name}: Refusing to commit transaction {transaction_id}, which is already aborted')
+                return twopc_pb2.CommitResponse(success=False)
+            self.store_transaction(transaction_id, 'COMMITTED')
         logging.info(f'{self.node_name}: Committed transaction {transaction_id}')
         return twopc_pb2.CommitResponse(success=True)
 
@@ -136,7 +535,21 @@ class Participant(twopc_pb2_grpc.TwoPCServicer):
         state = self.get_transaction_state(transaction_id)
         commit = state == 'COMMITTED'
         logging.info(f'{self.node_name}: FetchCommit response for transaction {transaction_id}: {commit}')
-        return twopc_pb2.FetchCommitResponse(commit=commit)
+        return twopc_pb2.FetchCommitResponse(commit=commit, state=twopc_pb2.State.Value(state or 'UNKNOWN'))
+
+    def QueryOutcome(self, request, context):
+        transaction_id = request.transaction_id
+        with self.lock:
+            if self.db_access_restricted:
+                return twopc_pb2.OutcomeResponse(state=twopc_pb2.UNKNOWN)
+            state = self.get_transaction_state(transaction_id)
+            if state in (None, 'INITIALIZED'):
+                # We never voted YES, so the coordinator cannot commit: abort unilaterally
+                self.store_transaction(transaction_id, 'ABORTED')
+                logging.info(f'{self.node_name}: Aborted transaction {transaction_id} on peer termination query')
+                state = 'ABORTED'
+        logging.info(f'{self.node_name}: QueryOutcome response for transaction {transaction_id}: {state}')
+        return twopc_pb2.OutcomeResponse(state=twopc_pb2.State.Value(state))
 
     def RestrictDBAccess(self, request, context):
         self.db_access_restricted = True
@@ -148,13 +561,126 @@ class Participant(twopc_pb2_grpc.TwoPCServicer):
         logging.info(f'{self.node_name}: Database access allowed')
         return twopc_pb2.Empty()
 
-def serve(port, node_name, db_name):
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
-    participant = Participant(node_name, db_name, port)
+    def ListTransactions(self, request, context):
+        if self.db_access_restricted:
+            context.abort(grpc.StatusCode.UNAVAILABLE, 'Database access restricted')
+        states = [twopc_pb2.State.Name(state) for state in request.states]
+        for transaction_id, state, peers in self.list_transactions(states, request.after_id, request.limit):
+            yield twopc_pb2.TransactionInfo(transaction_id=transaction_id, state=twopc_pb2.State.Value(state), peers=peers)
+
+    def ForceResolve(self, request, context):
+        transaction_id = request.transaction_id
+        outcome = twopc_pb2.State.Name(request.outcome)
+        if self.db_access_restricted:
+            context.abort(grpc.StatusCode.UNAVAILABLE, 'Database access restricted')
+        if outcome not in ('UNKNOWN',) + FINAL_STATES:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, 'outcome must be COMMITTED, ABORTED or UNKNOWN')
+        if outcome == 'UNKNOWN':
+            # Ask the coordinator and peers now instead of waiting for the in-doubt timer
+            if self.get_transaction_state(transaction_id) in IN_DOUBT_STATES:
+                self.resolve_in_doubt(transaction_id)
+        else:
+            with self.lock:
+                state = self.get_transaction_state(transaction_id)
+                if state in FINAL_STATES and state != outcome:
+                    context.abort(grpc.StatusCode.FAILED_PRECONDITION, f'Transaction {transaction_id} is already {state}')
+                # A heuristic decision: the operator takes responsibility for matching the other nodes
+                logging.warning(f'{self.node_name}: Force-resolving transaction {transaction_id} ({state}) to {outcome}')
+                self.store_transaction(transaction_id, outcome)
+        state = self.get_transaction_state(transaction_id)
+        return twopc_pb2.OutcomeResponse(state=twopc_pb2.State.Value(state or 'UNKNOWN'))
+
+    def Snapshot(self, request, context):
+        if self.db_access_restricted:
+            context.abort(grpc.StatusCode.UNAVAILABLE, 'Database access restricted')
+        logging.info(f'{self.node_name}: Sending snapshot')
+        yield from self.snapshot_chunks()
+
+    def GetMetrics(self, request, context):
+        values = {
+            'wal.bytes': os.path.getsize(self.log_file) if os.path.exists(self.log_file) else 0,
+            'channel.queue_depth': self.channel_pending,
+        }
+        for state, count in self.count_unfinished().items():
+            values[f'transactions.{state}'] = count
+        values.update(profiling.metrics())
+        return twopc_pb2.MetricsResponse(values=values)
+
+    def Profile(self, request, context):
+        if request.enable:
+            profiling.start()
+            logging.info(f'{self.node_name}: Profiling started')
+            return twopc_pb2.ProfileResponse(running=True)
+        try:
+            output = profiling.report_path(request.output or f'participant-{self.port}-profile')
+        except ValueError as e:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        files = profiling.stop(output)
+        logging.info(f'{self.node_name}: Profiling stopped, wrote {", ".join(files)}')
+        return twopc_pb2.ProfileResponse(running=False, files=files)
+
+    def channel_message_done(self, future):
+        with self.channel_lock:
+            self.channel_pending -= 1
+
+    def Channel(self, request_iterator, context):
+        responses = queue.Queue()
+
+        def handle(message):
+            kind = message.WhichOneof('body')
+            reply = twopc_pb2.ChannelMessage(correlation_id=message.correlation_id)
+            if kind not in CHANNEL_HANDLERS:
+                reply.error = f'Unexpected channel message {kind}'
+            else:
+                handler, response_field = CHANNEL_HANDLERS[kind]
+                try:
+                    with profiling.section(f'participant.rpc.{handler}'):
+                        response = getattr(self, handler)(getattr(message, kind), context)
+                    getattr(reply, response_field).CopyFrom(response)
+                except Exception as e:
+                    logging.error(f'{self.node_name}: Error handling {handler} on channel: {e}')
+                    reply.error = str(e)
+            responses.put(reply)
+
+        def dispatch():
+            handled = set()
+            chunks = {}
+            try:
+                for message in request_iterator:
+                    kind = message.WhichOneof('body')
+                    if kind == 'chunk':
+                        # Payload pieces arrive ahead of their prepare, in order
+                        chunks.setdefault(message.correlation_id, []).append(message.chunk.data)
+                        continue
+                    parts = chunks.pop(message.correlation_id, None)
+                    if parts is not None and kind == 'prepare':
+                        message.prepare.payload = b''.join(parts)
+                    with self.channel_lock:
+                        self.channel_pending += 1
+                    future = self.channel_executor.submit(handle, message)
+                    handled.add(future)
+                    future.add_done_callback(handled.discard)
+                    future.add_done_callback(self.channel_message_done)
+            except grpc.RpcError:
+                pass
+            futures.wait(list(handled))
+            responses.put(None)
+
+        threading.Thread(target=dispatch, daemon=True).start()
+        yield from iter(responses.get, None)
+
+def serve(port, node_name, db_name, coordinator_address, ready_file=None, transport=None, bootstrap_from=None, address=None):
+    transport = transport or Transport()
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10), interceptors=[profiling.interceptor('participant')],
+                         options=transport.options())
+    participant = Participant(node_name, db_name, port, coordinator_address, transport, bootstrap_from, address)
     twopc_pb2_grpc.add_TwoPCServicer_to_server(participant, server)
     server.add_insecure_port(f'[::]:{port}')
     server.start()
     logging.info(f'{node_name} started on port {port}')
+    if ready_file:
+        # Recovery ran in the constructor, so the participant is fully up once the server accepts calls
+        readiness.mark_ready(ready_file)
     server.wait_for_termination()
 
 if __name__ == '__main__':
@@ -163,7 +689,17 @@ if __name__ == '__main__':
     parser.add_argument('port', type=int, help='Port number')
     parser.add_argument('node_name', type=str, help='Name of the participant node')
     parser.add_argument('db_name', type=str, help='Database file name')
+    parser.add_argument('--coordinator', default='localhost:50053', help='Coordinator address used to resolve in-doubt transactions')
+    parser.add_argument('--max-message-size', type=int, help='Largest message (bytes) sent or received; gRPC default is 4 MB')
+    parser.add_argument('--window-size', type=int, help='HTTP/2 per-stream flow-control window (bytes); default adapts to bandwidth')
+    parser.add_argument('--bootstrap-from', metavar='ADDRESS', help='Replace the local database with a snapshot of this participant before serving')
+    parser.add_argument('--address', help='Address the other nodes use for this participant (default localhost:PORT)')
+    parser.add_argument('--profile', metavar='OUTPUT', help='Profile from startup; writes OUTPUT.collapsed and OUTPUT.txt on exit')
+    parser.add_argument('--ready-file', help='File created once recovery is done and the server is accepting calls')
     args = parser.parse_args()
 
     logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-    serve(args.port, args.node_name, args.db_name)
+    if args.profile:
+        profiling.profile_until_exit(args.profile)
+    transport = Transport(max_message_size=args.max_message_size, window_size=args.window_size)
+    serve(args.port, args.node_name, args.db_name, args.coordinator, args.ready_file, transport, args.bootstrap_from, args.address)
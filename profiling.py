@@ -0,0 +1,284 @@
+import grpc
+import collections
+import contextlib
+import threading
+import logging
+import signal
+import atexit
+import time
+import sys
+import os
+import re
+
+# The profiler in effect for this process, or None. Like the fault-injection hooks, the
+# section and lock hooks below cost one global lookup while profiling is off.
+active = None
+control_lock = threading.Lock()
+
+SAMPLE_INTERVAL = 0.005  # seconds between stack samples
+NOT_PROFILING = contextlib.nullcontext()
+PROFILE_DIR = 'profiles'  # Reports requested over the Profile RPC are written here, relative to the node's directory
+REPORT_NAME = re.compile(r'[A-Za-z0-9_-][A-Za-z0-9._-]*')
+
+
+def section(name):
+    if active is None:
+        return NOT_PROFILING
+    return Section(active, name)
+
+
+def metrics():
+    profiler = active
+    return profiler.metrics() if profiler is not None else {}
+
+
+def start(interval=SAMPLE_INTERVAL):
+    global active
+    with control_lock:
+        if active is None:
+            active = Profiler(interval).start()
+        return active
+
+
+def stop(output):
+    # Stops the running profiler and writes its reports; returns the files written
+    global active
+    with control_lock:
+        profiler, active = active, None
+    if profiler is None:
+        return []
+    profiler.stop()
+    return profiler.dump(output)
+
+
+def report_path(name):
+    # The Profile RPC is unauthenticated, so callers only pick a file name inside PROFILE_DIR
+    if not REPORT_NAME.fullmatch(name):
+        raise ValueError(f'Invalid profile name {name!r}: use letters, digits, ".", "_" and "-" only')
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    return os.path.join(PROFILE_DIR, name)
+
+
+def profile_until_exit(output):
+    # For --profile: profile from startup and write the reports on Ctrl-C or SIGTERM
+    start()
+    atexit.register(lambda: logging.info(f'Profile written to {", ".join(stop(output))}'))
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+
+class Timing:
+    __slots__ = ('count', 'total', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, elapsed):
+        self.count += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+
+
+class Section:
+    __slots__ = ('profiler', 'name', 'started')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.profiler.record(self.name, time.perf_counter() - self.started)
+
+
+class Profiler:
+    """Samples every thread's stack and times named sections while it is running.
+
+    Sections are the RPC handler, WAL, SQLite and logging steps the nodes mark with
+    profiling.section(); InstrumentedLock adds lock wait and hold times. Samples are
+    wall-clock, so threads blocked on I/O or a lock show up where they wait, and are
+    aggregated as collapsed stacks, the input format of flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.timings = collections.defaultdict(Timing)
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.started_at = None
+        self.elapsed = 0.0
+        self.stopped = threading.Event()
+        self.sampler = threading.Thread(target=self.sample, name='profiling-sampler', daemon=True)
+        self.timed_handlers = []
+
+    def start(self):
+        self.started_at = time.monotonic()
+        self.time_logging()
+        self.sampler.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.sampler.join()
+        self.untime_logging()
+        self.elapsed = time.monotonic() - self.started_at
+
+    def record(self, name, elapsed):
+        with self.lock:
+            self.timings[name].add(elapsed)
+
+    def time_logging(self):
+        # Log records are formatted and written by the root handlers, so timing those covers logging
+        for handler in logging.getLogger().handlers:
+            def timed(record, handle=handler.handle):
+                started = time.perf_counter()
+                try:
+                    return handle(record)
+                finally:
+                    self.record('logging', time.perf_counter() - started)
+            handler.handle = timed
+            self.timed_handlers.append(handler)
+
+    def untime_logging(self):
+        for handler in self.timed_handlers:
+            handler.__dict__.pop('handle', None)
+        self.timed_handlers = []
+
+    def sample(self):
+        me = threading.get_ident()
+        while not self.stopped.wait(self.interval):
+            # Numbered pool threads are folded together so their stacks aggregate
+            names = {thread.ident: re.sub(r'\d+', 'N', thread.name) for thread in threading.enumerate()}
+            stacks = []
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)})')
+                    frame = frame.f_back
+                stack.append(names.get(ident, 'thread'))
+                stacks.append(';'.join(reversed(stack)))
+            with self.lock:
+                self.stacks.update(stacks)
+                self.samples += 1
+
+    def metrics(self):
+        values = {}
+        with self.lock:
+            for name, timing in self.timings.items():
+                values[f'profile.{name}.count'] = timing.count
+                values[f'profile.{name}.mean_ms'] = timing.total / timing.count * 1000
+                values[f'profile.{name}.max_ms'] = timing.max * 1000
+            values['profile.samples'] = self.samples
+        return values
+
+    def dump(self, output):
+        collapsed = f'{output}.collapsed'
+        with open(collapsed, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{stack} {count}\n')
+        summary = f'{output}.txt'
+        with open(summary, 'w') as f:
+            f.write(f'{self.elapsed:.3f} s profiled, {self.samples} stack samples every {self.interval * 1000:g} ms\n\n')
+            f.write(f'{"section":<48} {"count":>8} {"total ms":>10} {"mean ms":>9} {"max ms":>9}\n')
+            for name, timing in sorted(self.timings.items(), key=lambda item: item[1].total, reverse=True):
+                f.write(f'{name:<48} {timing.count:>8} {timing.total * 1000:>10.1f} '
+                        f'{timing.total / timing.count * 1000:>9.3f} {timing.max * 1000:>9.3f}\n')
+        return [collapsed, summary]
+
+
+class InstrumentedLock:
+    """Wraps a threading.Lock or RLock and reports wait and hold times while profiling.
+
+    Only the outermost acquire of a reentrant lock is timed. The depth counter is
+    updated while the lock is held, so it needs no synchronization of its own.
+    """
+
+    def __init__(self, lock, name):
+        self.lock = lock
+        self.wait_section = f'lock.{name}.wait'
+        self.hold_section = f'lock.{name}.hold'
+        self.depth = 0
+        self.acquired_at = None
+
+    def acquire(self, blocking=True, timeout=-1):
+        profiler = active
+        if profiler is None:
+            if not self.lock.acquire(blocking, timeout):
+                return False
+            acquired_at = None
+        else:
+            started = time.perf_counter()
+            if not self.lock.acquire(blocking, timeout):
+                return False
+            acquired_at = time.perf_counter()
+            if self.depth == 0:
+                profiler.record(self.wait_section, acquired_at - started)
+        self.depth += 1
+        if self.depth == 1:
+            self.acquired_at = acquired_at
+        return True
+
+    def release(self):
+        self.depth -= 1
+        if self.depth == 0 and self.acquired_at is not None:
+            profiler = active
+            if profiler is not None:
+                profiler.record(self.hold_section, time.perf_counter() - self.acquired_at)
+            self.acquired_at = None
+        self.lock.release()
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+def interceptor(node):
+    return RpcTimingInterceptor(node)
+
+
+class RpcTimingInterceptor(grpc.ServerInterceptor):
+    # Times each unary handler as '<node>.rpc.<Method>'; streams time their own messages
+    def __init__(self, node):
+        self.node = node
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None or handler.unary_unary is None:
+            return handler
+        name = f'{self.node}.rpc.{handler_call_details.method.rsplit("/", 1)[-1]}'
+        behavior = handler.unary_unary
+
+        def timed(request, context):
+            with section(name):
+                return behavior(request, context)
+
+        return grpc.unary_unary_rpc_method_handler(timed, request_deserializer=handler.request_deserializer,
+                                                   response_serializer=handler.response_serializer)
+
+
+if __name__ == '__main__':
+    import argparse
+    import twopc_pb2
+    import twopc_pb2_grpc
+    parser = argparse.ArgumentParser(description='Start or stop profiling on a running coordinator or participant')
+    parser.add_argument('address', help='Node address (e.g., localhost:50053)')
+    parser.add_argument('action', choices=['start', 'stop'])
+    parser.add_argument('--output', default='', help=f'Report name, written under {PROFILE_DIR}/ on the node (default: <node>-<port>-profile)')
+    args = parser.parse_args()
+
+    stub = twopc_pb2_grpc.TwoPCStub(grpc.insecure_channel(args.address))
+    response = stub.Profile(twopc_pb2.ProfileRequest(enable=args.action == 'start', output=args.output))
+    if response.files:
+        print('\n'.join(response.files))
+    else:
+        print('Profiling' if response.running else 'Not profiling')
@@ -0,0 +1,29 @@
+import time
+import os
+
+POLL_INTERVAL = 0.005  # seconds between checks of a readiness file
+
+
+def mark_ready(path):
+    # Written under a temporary name and renamed, so a waiter never sees a partial file
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w') as f:
+        f.write(f'{os.getpid()}\n')
+    os.replace(temporary, path)
+
+
+def clear_ready(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def wait_ready(path, timeout, process=None):
+    # Returns False on timeout; raises if the process exits before it is ready
+    deadline = time.monotonic() + timeout
+    while not os.path.exists(path):
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f'Process {process.pid} exited with code {process.returncode} before becoming ready')
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(POLL_INTERVAL)
+    return True
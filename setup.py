@@ -1,53 +1,40 @@
-import subprocess
 import sys
 import time
 import pathlib
 import logging
+import launch
 
-def run_command(command):
-    """Run a command and print its output."""
-    process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    stdout, stderr = process.communicate()
-    if process.returncode != 0:
-        print(f"Command failed with error: {stderr.decode()}")
-    else:
-        print(stdout.decode())
+PROTO = pathlib.Path('twopc.proto')
+STUBS = [pathlib.Path('twopc_pb2.py'), pathlib.Path('twopc_pb2_grpc.py')]
+PARTICIPANT_PORTS = [50051, 50052]
+
+def stubs_current():
+    """The generated files are checked in; only regenerate them when the .proto is newer."""
+    return all(stub.exists() and stub.stat().st_mtime >= PROTO.stat().st_mtime for stub in STUBS)
+
+def generate_stubs():
+    from grpc_tools import protoc  # Heavy import, only paid when the stubs are stale
+    return protoc.main(['grpc_tools.protoc', '-I.', '--python_out=.', '--grpc_python_out=.', str(PROTO)]) == 0
 
 def main():
     print("Setting up the project...")
 
-    # Step 1: Generate gRPC Python files from the .proto file
-    print("Generating gRPC Python files...")
-    proto_command = "python -m grpc_tools.protoc -I. --python_out=. --grpc_python_out=. twopc.proto"
-    run_command(proto_command)
-
-    # Check if .proto files were generated successfully
-    if not (pathlib.Path('twopc_pb2.py').exists() and pathlib.Path('twopc_pb2_grpc.py').exists()):
-        print("Failed to generate gRPC Python files.")
-        sys.exit(1)
+    # Step 1: Generate gRPC Python files from the .proto file if it changed
+    if stubs_current():
+        print("gRPC Python files are up to date.")
+    else:
+        print("Generating gRPC Python files...")
+        if not generate_stubs() or not stubs_current():
+            print("Failed to generate gRPC Python files.")
+            sys.exit(1)
 
-    # Step 2: Start participant nodes
+    # Step 2: Start participant nodes in parallel and wait until they report ready
     print("Starting participant nodes...")
-
-    # Start Participant 1
-    p1 = subprocess.Popen(["python", "participant.py", "50051", "Participant 1", "participant1.db"], stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True)
-    time.sleep(1)  # Add a small delay to ensure Participant 1 starts before Participant 2
-
-    # Start Participant 2
-    p2 = subprocess.Popen(["python", "participant.py", "50052", "Participant 2", "participant2.db"], stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True)
-
-    # Print logs from participant nodes
-    print("Participant 1 logs:")
-    for line in iter(p1.stdout.readline, b''):
-        sys.stdout.write(line.decode())
-    for line in iter(p1.stderr.readline, b''):
-        sys.stderr.write(line.decode())
-
-    print("Participant 2 logs:")
-    for line in iter(p2.stdout.readline, b''):
-        sys.stdout.write(line.decode())
-    for line in iter(p2.stderr.readline, b''):
-        sys.stderr.write(line.decode())
+    started = time.monotonic()
+    nodes = launch.launch(PARTICIPANT_PORTS)
+    for name, process in nodes:
+        print(f"{name} ready (PID {process.pid}), logging to {name}.out.log")
+    print(f"Participants ready in {(time.monotonic() - started) * 1000:.0f} ms.")
 
     print("Setup complete.")
     print("To run a test scenario, use: python test_scenarios.py localhost:50051 localhost:50052 --test_part [1-4]")
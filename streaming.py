@@ -0,0 +1,183 @@
+import grpc
+from concurrent import futures
+import itertools
+import threading
+import logging
+import queue
+import time
+import twopc_pb2
+import twopc_pb2_grpc
+from transport import CHUNK_SIZE
+
+MAX_IN_FLIGHT = 256  # Requests allowed on one stream before callers wait for responses
+DEADLINE_SWEEP_INTERVAL = 0.05  # seconds between checks for expired per-request deadlines
+
+
+class ChannelError(grpc.RpcError):
+    def __init__(self, code, details):
+        super().__init__(details)
+        self._code = code
+        self._details = details
+
+    def code(self):
+        return self._code
+
+    def details(self):
+        return self._details
+
+
+class CallFuture(futures.Future):
+    # Behaves like the future returned by a unary stub's .future(): result() raises
+    # grpc.FutureTimeoutError on timeout and grpc.RpcError on failure.
+    def result(self, timeout=None):
+        try:
+            return super().result(timeout)
+        except futures.TimeoutError:
+            raise grpc.FutureTimeoutError()
+
+
+class Stream:
+    def __init__(self, stub):
+        self.requests = queue.Queue()
+        self.pending = {}
+        self.closed = False  # Set under StreamingStub.lock once teardown has collected the pending requests
+        self.call = stub.Channel(iter(self.requests.get, None))
+
+
+class StreamMethod:
+    def __init__(self, owner, request_field, response_field):
+        self.owner = owner
+        self.request_field = request_field
+        self.response_field = response_field
+
+    def future(self, request, timeout=None):
+        return self.owner.submit(self.request_field, self.response_field, request, timeout)
+
+    def __call__(self, request, timeout=None):
+        return self.future(request, timeout).result()
+
+
+class StreamingStub:
+    """Drop-in replacement for TwoPCStub that sends the protocol messages over one Channel stream.
+
+    Initialize, Prepare, PreCommit, Commit and Abort are multiplexed on a long-lived bidirectional
+    stream and matched to their responses by correlation id; every other RPC falls
+    through to the regular unary stub. At most max_in_flight requests are outstanding
+    at a time, and a broken stream fails its pending requests and is reopened on the
+    next call. A Prepare payload larger than chunk_size goes ahead of its request as
+    chunk messages, which other requests on the stream can interleave with.
+    """
+
+    def __init__(self, channel, max_in_flight=MAX_IN_FLIGHT, chunk_size=CHUNK_SIZE, stats=None,
+                 compression=grpc.Compression.NoCompression):
+        self.unary = twopc_pb2_grpc.TwoPCStub(channel)
+        self.chunk_size = chunk_size
+        self.stats = stats
+        self.compression = compression  # The stream's, for counting wire bytes; the channel applies it
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(max_in_flight)
+        self.correlation_ids = itertools.count(1)
+        self.stream = None
+        self.Initialize = StreamMethod(self, 'initialize', 'initialize_response')
+        self.Prepare = StreamMethod(self, 'prepare', 'prepare_response')
+        self.PreCommit = StreamMethod(self, 'precommit', 'precommit_response')
+        self.Commit = StreamMethod(self, 'commit', 'commit_response')
+        self.Abort = StreamMethod(self, 'abort', 'abort_response')
+        threading.Thread(target=self.sweep_deadlines, daemon=True).start()
+
+    def __getattr__(self, name):
+        return getattr(self.unary, name)
+
+    def open_stream(self):
+        with self.lock:
+            if self.stream is None:
+                self.stream = Stream(self.unary)
+                threading.Thread(target=self.read_responses, args=(self.stream,), daemon=True).start()
+            return self.stream
+
+    def submit(self, request_field, response_field, request, timeout):
+        future = CallFuture()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if not self.slots.acquire(timeout=timeout):
+            future.set_exception(ChannelError(grpc.StatusCode.DEADLINE_EXCEEDED, 'Timed out waiting for a stream slot'))
+            return future
+        correlation_id = next(self.correlation_ids)
+        while True:
+            stream = self.open_stream()
+            with self.lock:
+                # A stream that broke since open_stream has already failed its pending requests; use a fresh one
+                if not stream.closed:
+                    stream.pending[correlation_id] = (future, response_field, deadline, request.transaction_id)
+                    break
+        message = twopc_pb2.ChannelMessage(correlation_id=correlation_id)
+        getattr(message, request_field).CopyFrom(request)
+        if request_field == 'prepare' and self.chunk_size and len(message.prepare.payload) > self.chunk_size:
+            payload = message.prepare.payload
+            message.prepare.payload = b''
+            for offset in range(0, len(payload), self.chunk_size):
+                chunk = twopc_pb2.ChannelMessage(correlation_id=correlation_id)
+                chunk.chunk.data = payload[offset:offset + self.chunk_size]
+                self.send(stream, chunk, request.transaction_id)
+        self.send(stream, message, request.transaction_id)
+        return future
+
+    def send(self, stream, message, transaction_id):
+        if self.stats is not None:
+            self.stats.sent(transaction_id, message, self.compression)
+        stream.requests.put(message)
+
+    def complete(self, stream, correlation_id):
+        with self.lock:
+            entry = stream.pending.pop(correlation_id, None)
+        if entry is not None:
+            self.slots.release()
+        return entry
+
+    def read_responses(self, stream):
+        error = ChannelError(grpc.StatusCode.UNAVAILABLE, 'Channel stream closed')
+        try:
+            for message in stream.call:
+                entry = self.complete(stream, message.correlation_id)
+                if entry is None:
+                    continue
+                future, response_field, _, transaction_id = entry
+                if self.stats is not None:
+                    self.stats.received(transaction_id, message)
+                if message.error:
+                    future.set_exception(ChannelError(grpc.StatusCode.UNKNOWN, message.error))
+                else:
+                    future.set_result(getattr(message, response_field))
+        except grpc.RpcError as e:
+            logging.error(f'Channel stream failed: {e}')
+            error = e
+        with self.lock:
+            stream.closed = True
+            if self.stream is stream:
+                self.stream = None
+            correlation_ids = list(stream.pending)
+        stream.requests.put(None)
+        for correlation_id in correlation_ids:
+            entry = self.complete(stream, correlation_id)
+            if entry is not None:
+                entry[0].set_exception(error)
+
+    def sweep_deadlines(self):
+        while True:
+            time.sleep(DEADLINE_SWEEP_INTERVAL)
+            with self.lock:
+                stream = self.stream
+                if stream is None:
+                    continue
+                now = time.monotonic()
+                expired = [correlation_id for correlation_id, (_, _, deadline, _) in stream.pending.items()
+                           if deadline is not None and deadline <= now]
+            for correlation_id in expired:
+                entry = self.complete(stream, correlation_id)
+                if entry is not None:
+                    entry[0].set_exception(ChannelError(grpc.StatusCode.DEADLINE_EXCEEDED, 'Deadline Exceeded'))
+
+    def close(self):
+        with self.lock:
+            stream, self.stream = self.stream, None
+        if stream is not None:
+            stream.requests.put(None)
@@ -1,14 +1,21 @@
-import time
 import logging
 import subprocess
+import sys
 import os
-import psutil
 import grpc
 from coordinator import TransactionCoordinator, TIMEOUT
+from participant import IN_DOUBT_STATES
+from cluster import wait_until
+import readiness
 import twopc_pb2
 import twopc_pb2_grpc
 
+READY_FILE = 'coordinator.ready'
+READY_TIMEOUT = 30  # seconds the restarted coordinator may take to recover
+SETTLE_TIMEOUT = TIMEOUT + 5  # seconds participants may take to settle an in-doubt transaction on their own
+
 def kill_process_on_port(port):
+    import psutil  # Only needed by the scenarios that kill a node
     for proc in psutil.process_iter(["pid", "name"]):
         for conn in proc.net_connections(kind="inet"):
             if conn.laddr.port == port:
@@ -17,19 +24,38 @@ def kill_process_on_port(port):
                 return
 
 def restart_coordinator(participants, port):
-    command = f'python coordinator.py {" ".join(participants)} --port {port}'
-    logging.info(f"Restarting coordinator with command: {command}")
-    subprocess.Popen(command, shell=True)
+    command = [sys.executable, "coordinator.py", *participants, "--port", str(port), "--ready-file", READY_FILE]
+    logging.info(f"Restarting coordinator with command: {' '.join(command)}")
+    readiness.clear_ready(READY_FILE)
+    process = subprocess.Popen(command)
+    if not readiness.wait_ready(READY_FILE, READY_TIMEOUT, process):
+        logging.error(f"Coordinator not ready after {READY_TIMEOUT} seconds")
+        return
     logging.info("Coordinator restarted")
 
+def participant_state(stub, transaction_id):
+    # Read through ListTransactions: unlike QueryOutcome, it never aborts a transaction the participant has not seen
+    request = twopc_pb2.ListTransactionsRequest(after_id=transaction_id - 1, limit=1)
+    for info in stub.ListTransactions(request, timeout=TIMEOUT):
+        if info.transaction_id == transaction_id:
+            return twopc_pb2.State.Name(info.state)
+    return None
+
+def wait_until_settled(participants, transaction_id):
+    # Instead of sleeping past the participants' timeout, wait until none of them is in doubt
+    stubs = [twopc_pb2_grpc.TwoPCStub(grpc.insecure_channel(address)) for address in participants]
+    settled = wait_until(lambda: all(participant_state(stub, transaction_id) not in IN_DOUBT_STATES for stub in stubs),
+                         SETTLE_TIMEOUT)
+    if not settled:
+        logging.error(f"Transaction {transaction_id} still in doubt after {SETTLE_TIMEOUT} seconds")
+
 def test_part1(coordinator, participants, port, transaction_id):
-    coordinator.initialize_transaction(transaction_id) 
+    coordinator.store_transaction(transaction_id, "INITIALIZED")
     logging.info(f"Simulating coordinator failure before sending prepare for transaction {transaction_id}")
     kill_process_on_port(port)  # Kill the coordinator process
     logging.info("Coordinator process killed. Restarting...")
     restart_coordinator(participants, port)  # Restart the coordinator
     logging.info("Coordinator has restarted")
-    time.sleep(TIMEOUT + 5)  # Give the coordinator some time to restart
     coordinator.start_transaction(transaction_id)  # Retry the transaction
 
 def test_part2(coordinator, participant_stub, transaction_id):
@@ -69,7 +95,7 @@ def test_part3(coordinator, participants, port, transaction_id):
                 logging.info(f"Simulating coordinator failure after sending commit to the first participant for transaction {transaction_id}")
                 kill_process_on_port(port)  # Kill the coordinator process
                 logging.info("Coordinator process killed. Restarting...")
-                time.sleep(TIMEOUT + 5)  # Wait for a while before restarting
+                wait_until_settled(participants, transaction_id)  # Let participants try to settle it without us
                 restart_coordinator(participants, port)  # Restart the coordinator
                 return  # Exit the function to simulate the failure
 
@@ -84,14 +110,14 @@ def test_part3(coordinator, participants, port, transaction_id):
         coordinator.store_transaction(transaction_id, "COMMITTED")
         logging.info(f"Transaction {transaction_id} committed")
 
-def test_part4(coordinator, transaction_id):
+def test_part4(coordinator, participants, transaction_id):
     coordinator.store_transaction(transaction_id, "STARTED")
     for i, stub in enumerate(coordinator.stubs):
         stub.Initialize.future(twopc_pb2.InitializeRequest(transaction_id=transaction_id)).result(timeout=TIMEOUT)
         response = stub.Prepare.future(twopc_pb2.VoteRequest(transaction_id=transaction_id)).result(timeout=TIMEOUT)
         if i == 0:  # Simulate participant failure after voting yes
             logging.info(f"Simulating participant failure after voting yes for transaction {transaction_id}")
-            time.sleep(TIMEOUT + 5)  # Simulate participant failure by waiting longer than the timeout
+            wait_until_settled(participants[:1], transaction_id)  # Stay silent until its timeout has resolved it
         if response.vote:
             coordinator.store_transaction(transaction_id, "PREPARED")
         else:
@@ -101,9 +127,11 @@ def test_part4(coordinator, transaction_id):
 
 def run_test(coordinator, test_part, participants, port):
     while True:
-        transaction_id = input("Enter transaction ID (or 'q' to quit): ")
+        transaction_id = input("Enter transaction ID (blank for a new one, or 'q' to quit): ")
         if transaction_id.lower() == "q":
             break
+        transaction_id = int(transaction_id) if transaction_id else coordinator.new_transaction_id()
+        logging.info(f"Running test part {test_part} with transaction {transaction_id}")
         if test_part == 1:
             test_part1(coordinator, participants, port, transaction_id)
         elif test_part == 2:
@@ -112,7 +140,7 @@ def run_test(coordinator, test_part, participants, port):
         elif test_part == 3:
             test_part3(coordinator, participants, port, transaction_id)
         elif test_part == 4:
-            test_part4(coordinator, transaction_id)
+            test_part4(coordinator, participants, transaction_id)
 
 if __name__ == "__main__":
     import argparse
@@ -0,0 +1,159 @@
+import grpc
+import collections
+import threading
+import zlib
+
+COMPRESSION_THRESHOLD = 1024  # bytes; smaller messages are not worth compressing
+CHUNK_SIZE = 256 * 1024  # bytes of payload per message when a Prepare is streamed in chunks
+GRPC_MAX_MESSAGE_SIZE = 4 * 1024 * 1024  # gRPC's default receive limit, in effect without max_message_size
+ALGORITHMS = {
+    'none': grpc.Compression.NoCompression,
+    'gzip': grpc.Compression.Gzip,
+    'deflate': grpc.Compression.Deflate,
+}
+ZLIB_WBITS = {grpc.Compression.Gzip: 31, grpc.Compression.Deflate: 15}  # gRPC's gzip and deflate framings of zlib
+
+
+class CallDetails(collections.namedtuple('CallDetails', ('method', 'timeout', 'metadata', 'credentials',
+                                                         'wait_for_ready', 'compression')),
+                  grpc.ClientCallDetails):
+    pass
+
+
+def compressed_size(message, compression):
+    # Size of the message as gRPC sends it with `compression`, which compresses at zlib's default level
+    if compression not in ZLIB_WBITS:
+        return message.ByteSize()
+    compressor = zlib.compressobj(wbits=ZLIB_WBITS[compression])
+    return len(compressor.compress(message.SerializeToString())) + len(compressor.flush())
+
+
+class WireStats:
+    """Bytes of every message to and from participants, per transaction.
+
+    Message bytes are the protobuf encoding; wire bytes are what is sent after compression,
+    recomputed here because gRPC does not report it. Neither includes HTTP/2 framing.
+    Responses are counted uncompressed, as participants do not compress them. Only channels
+    opened with track_transactions attribute bytes to transactions, because only the
+    coordinator calls finish() to fold a transaction's total into the averages once it is final.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {}  # Open transaction -> [message bytes, wire bytes]
+        self.message_bytes_sent = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.messages = 0
+        self.transactions = 0
+        self.transaction_message_bytes = 0
+        self.transaction_bytes = 0
+
+    def sent(self, transaction_id, message, compression=grpc.Compression.NoCompression):
+        size = message.ByteSize()
+        wire_size = size if compression not in ZLIB_WBITS else compressed_size(message, compression)
+        with self.lock:
+            self.message_bytes_sent += size
+            self.bytes_sent += wire_size
+            self.messages += 1
+            if transaction_id is not None:
+                totals = self.pending.setdefault(transaction_id, [0, 0])
+                totals[0] += size
+                totals[1] += wire_size
+
+    def received(self, transaction_id, message):
+        size = message.ByteSize()
+        with self.lock:
+            self.bytes_received += size
+            self.messages += 1
+            # Only while the transaction is open; a straggling response must not reopen it
+            if transaction_id in self.pending:
+                self.pending[transaction_id][0] += size
+                self.pending[transaction_id][1] += size
+
+    def finish(self, transaction_id):
+        with self.lock:
+            totals = self.pending.pop(transaction_id, None)
+            if totals is not None:
+                self.transactions += 1
+                self.transaction_message_bytes += totals[0]
+                self.transaction_bytes += totals[1]
+
+    def metrics(self):
+        with self.lock:
+            return {
+                'wire.message_bytes_sent': self.message_bytes_sent,
+                'wire.bytes_sent': self.bytes_sent,
+                'wire.bytes_received': self.bytes_received,
+                'wire.messages': self.messages,
+                'wire.transactions': self.transactions,
+                'wire.message_bytes_per_transaction':
+                    self.transaction_message_bytes / self.transactions if self.transactions else 0.0,
+                'wire.bytes_per_transaction': self.transaction_bytes / self.transactions if self.transactions else 0.0,
+            }
+
+
+class Transport:
+    """Channel and server settings for every connection a node opens or accepts.
+
+    Unary requests of at least compression_threshold bytes are compressed with the chosen
+    algorithm; a Channel stream is compressed as a whole, because gRPC's Python API cannot
+    switch compression per message. max_message_size replaces gRPC's 4 MB receive limit,
+    and window_size fixes the HTTP/2 per-stream flow-control window instead of letting
+    gRPC size it from bandwidth-delay probes. Large Prepare payloads on a stream are
+    split into chunk_size pieces so they do not hold up other transactions' messages.
+    """
+
+    def __init__(self, compression='none', compression_threshold=COMPRESSION_THRESHOLD, max_message_size=None,
+                 window_size=None, chunk_size=CHUNK_SIZE):
+        self.compression = ALGORITHMS[compression]
+        self.compression_threshold = compression_threshold
+        self.max_message_size = max_message_size
+        self.window_size = window_size
+        self.chunk_size = chunk_size
+        self.stats = WireStats()
+
+    def options(self):
+        options = []
+        if self.max_message_size:
+            options += [('grpc.max_send_message_length', self.max_message_size),
+                        ('grpc.max_receive_message_length', self.max_message_size)]
+        if self.window_size:
+            options += [('grpc.http2.bdp_probe', 0), ('grpc.http2.lookahead_bytes', self.window_size)]
+        return options
+
+    def compression_for(self, size):
+        if size >= self.compression_threshold:
+            return self.compression
+        return grpc.Compression.NoCompression
+
+    def channel(self, address, track_transactions=False):
+        interceptor = TransportInterceptor(self, track_transactions)
+        return grpc.intercept_channel(grpc.insecure_channel(address, options=self.options()), interceptor)
+
+
+class TransportInterceptor(grpc.UnaryUnaryClientInterceptor, grpc.StreamStreamClientInterceptor):
+    def __init__(self, transport, track_transactions=False):
+        self.transport = transport
+        self.track_transactions = track_transactions
+
+    def with_compression(self, details, compression):
+        return CallDetails(details.method, details.timeout, details.metadata, details.credentials,
+                           details.wait_for_ready, compression)
+
+    def intercept_unary_unary(self, continuation, client_call_details, request):
+        compression = self.transport.compression_for(request.ByteSize())
+        transaction_id = getattr(request, 'transaction_id', None) if self.track_transactions else None
+        stats = self.transport.stats
+        stats.sent(transaction_id, request, compression)
+        call = continuation(self.with_compression(client_call_details, compression), request)
+
+        def count_response(call):
+            if call.exception() is None:
+                stats.received(transaction_id, call.result())
+        call.add_done_callback(count_response)
+        return call
+
+    def intercept_stream_stream(self, continuation, client_call_details, request_iterator):
+        # Stream messages are counted by StreamingStub, which knows their transactions
+        return continuation(self.with_compression(client_call_details, self.transport.compression), request_iterator)
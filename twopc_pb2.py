@@ -14,33 +14,73 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0btwopc.proto\x12\x05twopc\"+\n\x11InitializeRequest\x12\x16\n\x0etransaction_id\x18\x01 \x01(\t\"%\n\x0bVoteRequest\x12\x16\n\x0etransaction_id\x18\x01 \x01(\t\"\x1c\n\x0cVoteResponse\x12\x0c\n\x04vote\x18\x01 \x01(\x08\"\'\n\rCommitRequest\x12\x16\n\x0etransaction_id\x18\x01 \x01(\t\"!\n\x0e\x43ommitResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\"&\n\x0c\x41\x62ortRequest\x12\x16\n\x0etransaction_id\x18\x01 \x01(\t\" \n\rAbortResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\",\n\x12\x46\x65tchCommitRequest\x12\x16\n\x0etransaction_id\x18\x01 \x01(\t\"%\n\x13\x46\x65tchCommitResponse\x12\x0e\n\x06\x63ommit\x18\x01 \x01(\x08\"\x07\n\x05\x45mpty2\xff\x02\n\x05TwoPC\x12\x34\n\nInitialize\x12\x18.twopc.InitializeRequest\x1a\x0c.twopc.Empty\x12\x32\n\x07Prepare\x12\x12.twopc.VoteRequest\x1a\x13.twopc.VoteResponse\x12\x35\n\x06\x43ommit\x12\x14.twopc.CommitRequest\x1a\x15.twopc.CommitResponse\x12\x32\n\x05\x41\x62ort\x12\x13.twopc.AbortRequest\x1a\x14.twopc.AbortResponse\x12\x44\n\x0b\x46\x65tchCommit\x12\x19.twopc.FetchCommitRequest\x1a\x1a.twopc.FetchCommitResponse\x12.\n\x10RestrictDBAccess\x12\x0c.twopc.Empty\x1a\x0c.twopc.Empty\x12+\n\rAllowDBAccess\x12\x0c.twopc.Empty\x1a\x0c.twopc.Emptyb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0btwopc.proto\x12\x05twopc\"\'\n\rBeginResponse\x12\x16\n\x0etransaction_id\x18\x01 \x01(\x04\":\n\x11InitializeRequest\x12\x16\n\x0etransaction_id\x18\x01 \x01(\x04\x12\r\n\x05peers\x18\x02 \x03(\t\"\x81\x01\n\x0bVoteRequest\x12\x16\n\x0etransaction_id\x18\x01 \x01(\x04\x12\x13\n\x0bthree_phase\x18\x02 \x01(\x08\x12\x12\n\ninitialize\x18\x03 \x01(\x08\x12\r\n\x05peers\x18\x04 \x03(\t\x12\x0f\n\x07payload\x18\x05 \x01(\x0c\x12\x11\n\ttenant_id\x18\x06 \x01(\t\"\x1c\n\x0cVoteResponse\x12\x0c\n\x04vote\x18\x01 \x01(\x08\"*\n\x10PreCommitRequest\x12\x16\n\x0etransaction_id\x18\x01 \x01(\x04\"$\n\x11PreCommitResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\":\n\rCommitRequest\x12\x16\n\x0etransaction_id\x18\x01 \x01(\x04\x12\x11\n\ttenant_id\x18\x02 \x01(\t\"!\n\x0e\x43ommitResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\"9\n\x0c\x41\x62ortRequest\x12\x16\n\x0etransaction_id\x18\x01 \x01(\x04\x12\x11\n\ttenant_id\x18\x02 \x01(\t\" \n\rAbortResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\",\n\x12\x46\x65tchCommitRequest\x12\x16\n\x0etransaction_id\x18\x01 \x01(\x04\"B\n\x13\x46\x65tchCommitResponse\x12\x0e\n\x06\x63ommit\x18\x01 \x01(\x08\x12\x1b\n\x05state\x18\x02 \x01(\x0e\x32\x0c.twopc.State\".\n\x0fOutcomeResponse\x12\x1b\n\x05state\x18\x01 \x01(\x0e\x32\x0c.twopc.State\"\x07\n\x05\x45mpty\"0\n\x0eProfileRequest\x12\x0e\n\x06\x65nable\x18\x01 \x01(\x08\x12\x0e\n\x06output\x18\x02 \x01(\t\"1\n\x0fProfileResponse\x12\x0f\n\x07running\x18\x01 \x01(\x08\x12\r\n\x05\x66iles\x18\x02 \x03(\t\"X\n\x17ListTransactionsRequest\x12\x1c\n\x06states\x18\x01 \x03(\x0e\x32\x0c.twopc.State\x12\x10\n\x08\x61\x66ter_id\x18\x02 \x01(\x04\x12\r\n\x05limit\x18\x03 \x01(\r\"d\n\x0fTransactionInfo\x12\x16\n\x0etransaction_id\x18\x01 \x01(\x04\x12\x1b\n\x05state\x18\x02 \x01(\x0e\x32\x0c.twopc.State\x12\r\n\x05\x61\x63ked\x18\x03 \x03(\r\x12\r\n\x05peers\x18\x04 \x03(\t\"L\n\x13\x46orceResolveRequest\x12\x16\n\x0etransaction_id\x18\x01 \x01(\x04\x12\x1d\n\x07outcome\x18\x02 \x01(\x0e\x32\x0c.twopc.State\"\x11\n\x0fSnapshotRequest\"j\n\x0fTransactionRows\x12\x16\n\x0etransaction_id\x18\x01 \x03(\x04\x12\x1b\n\x05state\x18\x02 \x03(\x0e\x32\x0c.twopc.State\x12\r\n\x05peers\x18\x03 \x03(\t\x12\x13\n\x0bthree_phase\x18\x04 \x03(\x08\"F\n\x08\x44\x61taRows\x12\x16\n\x0etransaction_id\x18\x01 \x03(\x04\x12\x0f\n\x07payload\x18\x02 \x03(\x0c\x12\x11\n\tcontinued\x18\x03 \x01(\x08\"\x80\x01\n\rSnapshotChunk\x12,\n\x0ctransactions\x18\x01 \x01(\x0b\x32\x16.twopc.TransactionRows\x12\x1d\n\x04\x64\x61ta\x18\x02 \x01(\x0b\x32\x0f.twopc.DataRows\x12\"\n\x08wal_tail\x18\x03 \x03(\x0b\x32\x10.twopc.WalRecord\"t\n\x0fMetricsResponse\x12\x32\n\x06values\x18\x01 \x03(\x0b\x32\".twopc.MetricsResponse.ValuesEntry\x1a-\n\x0bValuesEntry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\r\n\x05value\x18\x02 \x01(\x01:\x02\x38\x01\"\x1c\n\x0cPayloadChunk\x12\x0c\n\x04\x64\x61ta\x18\x01 \x01(\x0c\"\xb0\x04\n\x0e\x43hannelMessage\x12\x16\n\x0e\x63orrelation_id\x18\x01 \x01(\x04\x12.\n\ninitialize\x18\x02 \x01(\x0b\x32\x18.twopc.InitializeRequestH\x00\x12%\n\x07prepare\x18\x03 \x01(\x0b\x32\x12.twopc.VoteRequestH\x00\x12&\n\x06\x63ommit\x18\x04 \x01(\x0b\x32\x14.twopc.CommitRequestH\x00\x12$\n\x05\x61\x62ort\x18\x05 \x01(\x0b\x32\x13.twopc.AbortRequestH\x00\x12+\n\x13initialize_response\x18\x06 \x01(\x0b\x32\x0c.twopc.EmptyH\x00\x12/\n\x10prepare_response\x18\x07 \x01(\x0b\x32\x13.twopc.VoteResponseH\x00\x12\x30\n\x0f\x63ommit_response\x18\x08 \x01(\x0b\x32\x15.twopc.CommitResponseH\x00\x12.\n\x0e\x61\x62ort_response\x18\t \x01(\x0b\x32\x14.twopc.AbortResponseH\x00\x12,\n\tprecommit\x18\x0b \x01(\x0b\x32\x17.twopc.PreCommitRequestH\x00\x12\x36\n\x12precommit_response\x18\x0c \x01(\x0b\x32\x18.twopc.PreCommitResponseH\x00\x12$\n\x05\x63hunk\x18\r \x01(\x0b\x32\x13.twopc.PayloadChunkH\x00\x12\r\n\x05\x65rror\x18\n \x01(\tB\x06\n\x04\x62ody\"\x86\x01\n\tWalRecord\x12\x16\n\x0etransaction_id\x18\x01 \x01(\x04\x12\x1b\n\x05state\x18\x02 \x01(\x0e\x32\x0c.twopc.State\x12\x0f\n\x07sent_to\x18\x03 \x03(\r\x12\r\n\x05peers\x18\x04 \x03(\t\x12\x13\n\x0bthree_phase\x18\x05 \x01(\x08\x12\x0f\n\x07payload\x18\x06 \x01(\x0c*\x9f\x01\n\x05State\x12\x0b\n\x07UNKNOWN\x10\x00\x12\x0f\n\x0bINITIALIZED\x10\x01\x12\x0b\n\x07STARTED\x10\x02\x12\x0c\n\x08PREPARED\x10\x03\x12\x0e\n\nCOMMITTING\x10\x04\x12\r\n\tCOMMITTED\x10\x05\x12\x0c\n\x08\x41\x42ORTING\x10\x06\x12\x0b\n\x07\x41\x42ORTED\x10\x07\x12\x11\n\rPRECOMMITTING\x10\x08\x12\x10\n\x0cPRECOMMITTED\x10\t2\xa8\x07\n\x05TwoPC\x12+\n\x05\x42\x65gin\x12\x0c.twopc.Empty\x1a\x14.twopc.BeginResponse\x12\x34\n\nInitialize\x12\x18.twopc.InitializeRequest\x1a\x0c.twopc.Empty\x12\x32\n\x07Prepare\x12\x12.twopc.VoteRequest\x1a\x13.twopc.VoteResponse\x12>\n\tPreCommit\x12\x17.twopc.PreCommitRequest\x1a\x18.twopc.PreCommitResponse\x12\x35\n\x06\x43ommit\x12\x14.twopc.CommitRequest\x1a\x15.twopc.CommitResponse\x12\x32\n\x05\x41\x62ort\x12\x13.twopc.AbortRequest\x1a\x14.twopc.AbortResponse\x12\x44\n\x0b\x46\x65tchCommit\x12\x19.twopc.FetchCommitRequest\x1a\x1a.twopc.FetchCommitResponse\x12\x41\n\x0cQueryOutcome\x12\x19.twopc.FetchCommitRequest\x1a\x16.twopc.OutcomeResponse\x12.\n\x10RestrictDBAccess\x12\x0c.twopc.Empty\x1a\x0c.twopc.Empty\x12+\n\rAllowDBAccess\x12\x0c.twopc.Empty\x1a\x0c.twopc.Empty\x12;\n\x07\x43hannel\x12\x15.twopc.ChannelMessage\x1a\x15.twopc.ChannelMessage(\x01\x30\x01\x12\x32\n\nGetMetrics\x12\x0c.twopc.Empty\x1a\x16.twopc.MetricsResponse\x12\x38\n\x07Profile\x12\x15.twopc.ProfileRequest\x1a\x16.twopc.ProfileResponse\x12L\n\x10ListTransactions\x12\x1e.twopc.ListTransactionsRequest\x1a\x16.twopc.TransactionInfo0\x01\x12\x42\n\x0c\x46orceResolve\x12\x1a.twopc.ForceResolveRequest\x1a\x16.twopc.OutcomeResponse\x12:\n\x08Snapshot\x12\x16.twopc.SnapshotRequest\x1a\x14.twopc.SnapshotChunk0\x01\x62\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
 _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'twopc_pb2', _globals)
 if not _descriptor._USE_C_DESCRIPTORS:
   DESCRIPTOR._loaded_options = None
-  _globals['_INITIALIZEREQUEST']._serialized_start=22
-  _globals['_INITIALIZEREQUEST']._serialized_end=65
-  _globals['_VOTEREQUEST']._serialized_start=67
-  _globals['_VOTEREQUEST']._serialized_end=104
-  _globals['_VOTERESPONSE']._serialized_start=106
-  _globals['_VOTERESPONSE']._serialized_end=134
-  _globals['_COMMITREQUEST']._serialized_start=136
-  _globals['_COMMITREQUEST']._serialized_end=175
-  _globals['_COMMITRESPONSE']._serialized_start=177
-  _globals['_COMMITRESPONSE']._serialized_end=210
-  _globals['_ABORTREQUEST']._serialized_start=212
-  _globals['_ABORTREQUEST']._serialized_end=250
-  _globals['_ABORTRESPONSE']._serialized_start=252
-  _globals['_ABORTRESPONSE']._serialized_end=284
-  _globals['_FETCHCOMMITREQUEST']._serialized_start=286
-  _globals['_FETCHCOMMITREQUEST']._serialized_end=330
-  _globals['_FETCHCOMMITRESPONSE']._serialized_start=332
-  _globals['_FETCHCOMMITRESPONSE']._serialized_end=369
-  _globals['_EMPTY']._serialized_start=371
-  _globals['_EMPTY']._serialized_end=378
-  _globals['_TWOPC']._serialized_start=381
-  _globals['_TWOPC']._serialized_end=764
+  _globals['_METRICSRESPONSE_VALUESENTRY']._loaded_options = None
+  _globals['_METRICSRESPONSE_VALUESENTRY']._serialized_options = b'8\001'
+  _globals['_STATE']._serialized_start=2276
+  _globals['_STATE']._serialized_end=2435
+  _globals['_BEGINRESPONSE']._serialized_start=22
+  _globals['_BEGINRESPONSE']._serialized_end=61
+  _globals['_INITIALIZEREQUEST']._serialized_start=63
+  _globals['_INITIALIZEREQUEST']._serialized_end=121
+  _globals['_VOTEREQUEST']._serialized_start=124
+  _globals['_VOTEREQUEST']._serialized_end=253
+  _globals['_VOTERESPONSE']._serialized_start=255
+  _globals['_VOTERESPONSE']._serialized_end=283
+  _globals['_PRECOMMITREQUEST']._serialized_start=285
+  _globals['_PRECOMMITREQUEST']._serialized_end=327
+  _globals['_PRECOMMITRESPONSE']._serialized_start=329
+  _globals['_PRECOMMITRESPONSE']._serialized_end=365
+  _globals['_COMMITREQUEST']._serialized_start=367
+  _globals['_COMMITREQUEST']._serialized_end=425
+  _globals['_COMMITRESPONSE']._serialized_start=427
+  _globals['_COMMITRESPONSE']._serialized_end=460
+  _globals['_ABORTREQUEST']._serialized_start=462
+  _globals['_ABORTREQUEST']._serialized_end=519
+  _globals['_ABORTRESPONSE']._serialized_start=521
+  _globals['_ABORTRESPONSE']._serialized_end=553
+  _globals['_FETCHCOMMITREQUEST']._serialized_start=555
+  _globals['_FETCHCOMMITREQUEST']._serialized_end=599
+  _globals['_FETCHCOMMITRESPONSE']._serialized_start=601
+  _globals['_FETCHCOMMITRESPONSE']._serialized_end=667
+  _globals['_OUTCOMERESPONSE']._serialized_start=669
+  _globals['_OUTCOMERESPONSE']._serialized_end=715
+  _globals['_EMPTY']._serialized_start=717
+  _globals['_EMPTY']._serialized_end=724
+  _globals['_PROFILEREQUEST']._serialized_start=726
+  _globals['_PROFILEREQUEST']._serialized_end=774
+  _globals['_PROFILERESPONSE']._serialized_start=776
+  _globals['_PROFILERESPONSE']._serialized_end=825
+  _globals['_LISTTRANSACTIONSREQUEST']._serialized_start=827
+  _globals['_LISTTRANSACTIONSREQUEST']._serialized_end=915
+  _globals['_TRANSACTIONINFO']._serialized_start=917
+  _globals['_TRANSACTIONINFO']._serialized_end=1017
+  _globals['_FORCERESOLVEREQUEST']._serialized_start=1019
+  _globals['_FORCERESOLVEREQUEST']._serialized_end=1095
+  _globals['_SNAPSHOTREQUEST']._serialized_start=1097
+  _globals['_SNAPSHOTREQUEST']._serialized_end=1114
+  _globals['_TRANSACTIONROWS']._serialized_start=1116
+  _globals['_TRANSACTIONROWS']._serialized_end=1222
+  _globals['_DATAROWS']._serialized_start=1224
+  _globals['_DATAROWS']._serialized_end=1294
+  _globals['_SNAPSHOTCHUNK']._serialized_start=1297
+  _globals['_SNAPSHOTCHUNK']._serialized_end=1425
+  _globals['_METRICSRESPONSE']._serialized_start=1427
+  _globals['_METRICSRESPONSE']._serialized_end=1543
+  _globals['_METRICSRESPONSE_VALUESENTRY']._serialized_start=1498
+  _globals['_METRICSRESPONSE_VALUESENTRY']._serialized_end=1543
+  _globals['_PAYLOADCHUNK']._serialized_start=1545
+  _globals['_PAYLOADCHUNK']._serialized_end=1573
+  _globals['_CHANNELMESSAGE']._serialized_start=1576
+  _globals['_CHANNELMESSAGE']._serialized_end=2136
+  _globals['_WALRECORD']._serialized_start=2139
+  _globals['_WALRECORD']._serialized_end=2273
+  _globals['_TWOPC']._serialized_start=2438
+  _globals['_TWOPC']._serialized_end=3374
 # @@protoc_insertion_point(module_scope)
@@ -39,6 +39,11 @@ class TwoPCStub(object):
         Args:
             channel: A grpc.Channel.
         """
+        self.Begin = channel.unary_unary(
+                '/twopc.TwoPC/Begin',
+                request_serializer=twopc__pb2.Empty.SerializeToString,
+                response_deserializer=twopc__pb2.BeginResponse.FromString,
+                _registered_method=True)
         self.Initialize = channel.unary_unary(
                 '/twopc.TwoPC/Initialize',
                 request_serializer=twopc__pb2.InitializeRequest.SerializeToString,
@@ -49,6 +54,11 @@ class TwoPCStub(object):
                 request_serializer=twopc__pb2.VoteRequest.SerializeToString,
                 response_deserializer=twopc__pb2.VoteResponse.FromString,
                 _registered_method=True)
+        self.PreCommit = channel.unary_unary(
+                '/twopc.TwoPC/PreCommit',
+                request_serializer=twopc__pb2.PreCommitRequest.SerializeToString,
+                response_deserializer=twopc__pb2.PreCommitResponse.FromString,
+                _registered_method=True)
         self.Commit = channel.unary_unary(
                 '/twopc.TwoPC/Commit',
                 request_serializer=twopc__pb2.CommitRequest.SerializeToString,
@@ -64,6 +74,11 @@ class TwoPCStub(object):
                 request_serializer=twopc__pb2.FetchCommitRequest.SerializeToString,
                 response_deserializer=twopc__pb2.FetchCommitResponse.FromString,
                 _registered_method=True)
+        self.QueryOutcome = channel.unary_unary(
+                '/twopc.TwoPC/QueryOutcome',
+                request_serializer=twopc__pb2.FetchCommitRequest.SerializeToString,
+                response_deserializer=twopc__pb2.OutcomeResponse.FromString,
+                _registered_method=True)
         self.RestrictDBAccess = channel.unary_unary(
                 '/twopc.TwoPC/RestrictDBAccess',
                 request_serializer=twopc__pb2.Empty.SerializeToString,
@@ -74,11 +89,47 @@ class TwoPCStub(object):
                 request_serializer=twopc__pb2.Empty.SerializeToString,
                 response_deserializer=twopc__pb2.Empty.FromString,
                 _registered_method=True)
+        self.Channel = channel.stream_stream(
+                '/twopc.TwoPC/Channel',
+                request_serializer=twopc__pb2.ChannelMessage.SerializeToString,
+                response_deserializer=twopc__pb2.ChannelMessage.FromString,
+                _registered_method=True)
+        self.GetMetrics = channel.unary_unary(
+                '/twopc.TwoPC/GetMetrics',
+                request_serializer=twopc__pb2.Empty.SerializeToString,
+                response_deserializer=twopc__pb2.MetricsResponse.FromString,
+                _registered_method=True)
+        self.Profile = channel.unary_unary(
+                '/twopc.TwoPC/Profile',
+                request_serializer=twopc__pb2.ProfileRequest.SerializeToString,
+                response_deserializer=twopc__pb2.ProfileResponse.FromString,
+                _registered_method=True)
+        self.ListTransactions = channel.unary_stream(
+                '/twopc.TwoPC/ListTransactions',
+                request_serializer=twopc__pb2.ListTransactionsRequest.SerializeToString,
+                response_deserializer=twopc__pb2.TransactionInfo.FromString,
+                _registered_method=True)
+        self.ForceResolve = channel.unary_unary(
+                '/twopc.TwoPC/ForceResolve',
+                request_serializer=twopc__pb2.ForceResolveRequest.SerializeToString,
+                response_deserializer=twopc__pb2.OutcomeResponse.FromString,
+                _registered_method=True)
+        self.Snapshot = channel.unary_stream(
+                '/twopc.TwoPC/Snapshot',
+                request_serializer=twopc__pb2.SnapshotRequest.SerializeToString,
+                response_deserializer=twopc__pb2.SnapshotChunk.FromString,
+                _registered_method=True)
 
 
 class TwoPCServicer(object):
     """Missing associated documentation comment in .proto file."""
 
+    def Begin(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
     def Initialize(self, request, context):
         """Missing associated documentation comment in .proto file."""
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
@@ -91,6 +142,12 @@ class TwoPCServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def PreCommit(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
     def Commit(self, request, context):
         """Missing associated documentation comment in .proto file."""
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
@@ -109,6 +166,12 @@ class TwoPCServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def QueryOutcome(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
     def RestrictDBAccess(self, request, context):
         """Missing associated documentation comment in .proto file."""
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
@@ -121,9 +184,50 @@ class TwoPCServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def Channel(self, request_iterator, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def GetMetrics(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def Profile(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def ListTransactions(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def ForceResolve(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def Snapshot(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_TwoPCServicer_to_server(servicer, server):
     rpc_method_handlers = {
+            'Begin': grpc.unary_unary_rpc_method_handler(
+                    servicer.Begin,
+                    request_deserializer=twopc__pb2.Empty.FromString,
+                    response_serializer=twopc__pb2.BeginResponse.SerializeToString,
+            ),
             'Initialize': grpc.unary_unary_rpc_method_handler(
                     servicer.Initialize,
                     request_deserializer=twopc__pb2.InitializeRequest.FromString,
@@ -134,6 +238,11 @@ def add_TwoPCServicer_to_server(servicer, server):
                     request_deserializer=twopc__pb2.VoteRequest.FromString,
                     response_serializer=twopc__pb2.VoteResponse.SerializeToString,
             ),
+            'PreCommit': grpc.unary_unary_rpc_method_handler(
+                    servicer.PreCommit,
+                    request_deserializer=twopc__pb2.PreCommitRequest.FromString,
+                    response_serializer=twopc__pb2.PreCommitResponse.SerializeToString,
+            ),
             'Commit': grpc.unary_unary_rpc_method_handler(
                     servicer.Commit,
                     request_deserializer=twopc__pb2.CommitRequest.FromString,
@@ -149,6 +258,11 @@ def add_TwoPCServicer_to_server(servicer, server):
                     request_deserializer=twopc__pb2.FetchCommitRequest.FromString,
                     response_serializer=twopc__pb2.FetchCommitResponse.SerializeToString,
             ),
+            'QueryOutcome': grpc.unary_unary_rpc_method_handler(
+                    servicer.QueryOutcome,
+                    request_deserializer=twopc__pb2.FetchCommitRequest.FromString,
+                    response_serializer=twopc__pb2.OutcomeResponse.SerializeToString,
+            ),
             'RestrictDBAccess': grpc.unary_unary_rpc_method_handler(
                     servicer.RestrictDBAccess,
                     request_deserializer=twopc__pb2.Empty.FromString,
@@ -159,6 +273,36 @@ def add_TwoPCServicer_to_server(servicer, server):
                     request_deserializer=twopc__pb2.Empty.FromString,
                     response_serializer=twopc__pb2.Empty.SerializeToString,
             ),
+            'Channel': grpc.stream_stream_rpc_method_handler(
+                    servicer.Channel,
+                    request_deserializer=twopc__pb2.ChannelMessage.FromString,
+                    response_serializer=twopc__pb2.ChannelMessage.SerializeToString,
+            ),
+            'GetMetrics': grpc.unary_unary_rpc_method_handler(
+                    servicer.GetMetrics,
+                    request_deserializer=twopc__pb2.Empty.FromString,
+                    response_serializer=twopc__pb2.MetricsResponse.SerializeToString,
+            ),
+            'Profile': grpc.unary_unary_rpc_method_handler(
+                    servicer.Profile,
+                    request_deserializer=twopc__pb2.ProfileRequest.FromString,
+                    response_serializer=twopc__pb2.ProfileResponse.SerializeToString,
+            ),
+            'ListTransactions': grpc.unary_stream_rpc_method_handler(
+                    servicer.ListTransactions,
+                    request_deserializer=twopc__pb2.ListTransactionsRequest.FromString,
+                    response_serializer=twopc__pb2.TransactionInfo.SerializeToString,
+            ),
+            'ForceResolve': grpc.unary_unary_rpc_method_handler(
+                    servicer.ForceResolve,
+                    request_deserializer=twopc__pb2.ForceResolveRequest.FromString,
+                    response_serializer=twopc__pb2.OutcomeResponse.SerializeToString,
+            ),
+            'Snapshot': grpc.unary_stream_rpc_method_handler(
+                    servicer.Snapshot,
+                    request_deserializer=twopc__pb2.SnapshotRequest.FromString,
+                    response_serializer=twopc__pb2.SnapshotChunk.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'twopc.TwoPC', rpc_method_handlers)
@@ -170,6 +314,33 @@ def add_TwoPCServicer_to_server(servicer, server):
 class TwoPC(object):
     """Missing associated documentation comment in .proto file."""
 
+    @staticmethod
+    def Begin(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/twopc.TwoPC/Begin',
+            twopc__pb2.Empty.SerializeToString,
+            twopc__pb2.BeginResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
     @staticmethod
     def Initialize(request,
             target,
@@ -224,6 +395,33 @@ class TwoPC(object):
             metadata,
             _registered_method=True)
 
+    @staticmethod
+    def PreCommit(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/twopc.TwoPC/PreCommit',
+            twopc__pb2.PreCommitRequest.SerializeToString,
+            twopc__pb2.PreCommitResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
     @staticmethod
     def Commit(request,
             target,
@@ -305,6 +503,33 @@ class TwoPC(object):
             metadata,
             _registered_method=True)
 
+    @staticmethod
+    def QueryOutcome(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/twopc.TwoPC/QueryOutcome',
+            twopc__pb2.FetchCommitRequest.SerializeToString,
+            twopc__pb2.OutcomeResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
     @staticmethod
     def RestrictDBAccess(request,
             target,
@@ -358,3 +583,165 @@ class TwoPC(object):
             timeout,
             metadata,
             _registered_method=True)
+
+    @staticmethod
+    def Channel(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_stream(
+            request_iterator,
+            target,
+            '/twopc.TwoPC/Channel',
+            twopc__pb2.ChannelMessage.SerializeToString,
+            twopc__pb2.ChannelMessage.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def GetMetrics(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/twopc.TwoPC/GetMetrics',
+            twopc__pb2.Empty.SerializeToString,
+            twopc__pb2.MetricsResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def Profile(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/twopc.TwoPC/Profile',
+            twopc__pb2.ProfileRequest.SerializeToString,
+            twopc__pb2.ProfileResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def ListTransactions(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/twopc.TwoPC/ListTransactions',
+            twopc__pb2.ListTransactionsRequest.SerializeToString,
+            twopc__pb2.TransactionInfo.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def ForceResolve(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/twopc.TwoPC/ForceResolve',
+            twopc__pb2.ForceResolveRequest.SerializeToString,
+            twopc__pb2.OutcomeResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def Snapshot(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/twopc.TwoPC/Snapshot',
+            twopc__pb2.SnapshotRequest.SerializeToString,
+            twopc__pb2.SnapshotChunk.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
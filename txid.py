@@ -0,0 +1,27 @@
+import threading
+import time
+
+EPOCH_MS = 1704067200000  # 2024-01-01T00:00:00Z; keeps ids below 2**63 for SQLite's signed INTEGER
+SEQUENCE_BITS = 20  # Ids available per millisecond before borrowing from the next one
+
+
+def id_at(timestamp):
+    # Smallest id generated at or after `timestamp` (seconds since the Unix epoch)
+    return (int(timestamp * 1000) - EPOCH_MS) << SEQUENCE_BITS
+
+
+class TransactionIdGenerator:
+    """Monotonic, time-ordered 64-bit transaction ids: milliseconds since EPOCH_MS, then a sequence.
+
+    Seeded with the largest id already stored so ids keep increasing across restarts even
+    if the clock steps backwards.
+    """
+
+    def __init__(self, last_id=0):
+        self.last_id = last_id
+        self.lock = threading.Lock()
+
+    def next(self):
+        with self.lock:
+            self.last_id = max(id_at(time.time()), self.last_id + 1)
+            return self.last_id
@@ -0,0 +1,49 @@
+import struct
+import os
+import twopc_pb2
+import faults
+
+LENGTH = struct.Struct('<I')  # Every record is prefixed with its serialized length
+
+
+def encode(transaction_id, state, sent_to=None, peers=None, three_phase=False, payload=None):
+    record = twopc_pb2.WalRecord(transaction_id=transaction_id, state=twopc_pb2.State.Value(state),
+                                 sent_to=sent_to or [], peers=peers or [], three_phase=three_phase,
+                                 payload=payload or b'')
+    data = record.SerializeToString()
+    return LENGTH.pack(len(data)) + data
+
+
+def append(path, data, force=False):
+    with open(path, 'ab') as f:
+        f.write(data)
+        if force:
+            f.flush()
+            os.fsync(f.fileno())
+    faults.wal_appended(path, len(data), force)
+
+
+def size(path):
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+def read(path, offset=0):
+    # Yields WalRecords in order, starting at a record boundary. A torn record at the tail
+    # (crash mid-append) ends the log.
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        data = f.read()
+    offset = 0
+    while offset + LENGTH.size <= len(data):
+        (length,) = LENGTH.unpack_from(data, offset)
+        end = offset + LENGTH.size + length
+        if end > len(data):
+            break
+        record = twopc_pb2.WalRecord()
+        record.ParseFromString(data[offset + LENGTH.size:end])
+        yield record
+        offset = end
+
+
+def state_name(record):
+    return twopc_pb2.State.Name(record.state)